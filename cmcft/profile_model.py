@@ -0,0 +1,47 @@
+# profile_model.py
+# Test rig comparing dense and sparse Pyomo model construction
+#
+#
+# This script is 'quick and dirty' only to be used to testing and profiling.
+# For use of the tracker call the track func in track.py from elsewhere.
+
+import os
+import glob
+import time
+import tempfile
+
+from tools import frames, graph, params
+from tools.solve.opto import model_construct, model_construct_dense
+
+# Setup Image directories
+cwd = os.getcwd()
+parent = os.path.abspath(os.path.join(cwd, '../../'))
+
+images = parent + '/test_datasets/Fluo-N2DH-SIM/02_GT/SEG'
+img_files = sorted(glob.glob(images + '/*.tif'))
+
+# Problems for the first few frame pairs
+problems = []
+features = [frames.frame_features(f) for f in img_files[:4]]
+for l_feat, r_feat in zip(features[:-1], features[1:]):
+    g = graph.construct(l_feat, r_feat, w=110, prune=(0.25, 0.2))
+    a_coup, a_vertices, a_edges = params.a_matrix(g)
+    problems.append((a_coup,
+                     params.b_flow(a_vertices),
+                     params.c_cost(g, a_coup, a_edges),
+                     params.x_bound(a_coup, a_vertices)))
+
+# Time construction and size of LP file written for GLPK
+lp_file = os.path.join(tempfile.mkdtemp(), 'model.lp')
+for name, construct in (('dense', model_construct_dense),
+                        ('sparse', model_construct)):
+    for a_coup, b_flow, c_cost, x_bound in problems:
+        start = time.time()
+        model = construct(a_coup, b_flow, c_cost, x_bound)
+        build_time = time.time() - start
+
+        model.write(lp_file)
+        print('%-6s  |V|=%-5d |E|=%-7d nnz=%-7d build %7.3fs  '
+              'LP file %9d bytes'
+              % (name, a_coup.shape[0], a_coup.shape[1], a_coup.nnz,
+                 build_time, os.path.getsize(lp_file)))
@@ -0,0 +1,10 @@
+from .features import frame_features
+from .features import sequence_features
+from .features import source_features
+from .features import cell_stats
+from .features import label_cell_stats
+from .prefetch import prefetch_features
+from .sources import open_source
+from .sources import FileSource
+from .sources import TiffStackSource
+from .sources import ArraySource
@@ -0,0 +1,258 @@
+# features.py
+# Functions to extract (and optionally cache) the cell features of frames
+
+# Import external packages
+import hashlib
+import os
+import numpy as np
+from scipy import ndimage
+from skimage.measure import label, regionprops
+
+# Import functions
+from sources import FileSource, open_source
+
+__all__ = ['sequence_features', 'frame_features', 'source_features',
+           'cell_stats', 'image_cell_stats', 'label_cell_stats',
+           'cache_path', 'key_path']
+
+# Keys of the per-frame feature arrays
+FEATURE_KEYS = ('centroid', 'area', 'filled_area', 'bbox')
+
+
+def sequence_features(frames, cache_dir=None, start=0, labelled=False,
+                      min_size=50):
+
+    # sequence_features
+    # Generator over an ordered sequence of image frames. The features of
+    # each frame are extracted exactly once, so the features of the right
+    # frame of one pair can be passed forward as the left frame of the next.
+    # Frames are read one at a time.
+    #
+    # Inputs:   frames      - ordered list of paths to image files, or a
+    #                         frame source (see sources.open_source)
+    #           cache_dir   - optional directory for on-disk feature cache
+    #           start       - index of first frame
+    #           labelled    - frames are label images, see cell_stats
+    #           min_size    - minimum cell size, see cell_stats
+    #
+    # Outputs:  (name, features) tuple for each frame in turn, name is the
+    #           image file path for image files
+    #
+
+    source = open_source(frames)
+
+    for i in xrange(start, len(source)):
+        yield source.name(i), source_features(source, i, cache_dir=cache_dir,
+                                              labelled=labelled,
+                                              min_size=min_size)
+
+
+def frame_features(img_path, cache_dir=None, labelled=False, min_size=50):
+
+    # frame_features
+    # Return the cell features of a single image file, see source_features
+    #
+    # Inputs:   img_path    - path to image file
+    #           cache_dir   - optional directory for on-disk feature cache
+    #           labelled    - image is a label image, see cell_stats
+    #           min_size    - minimum cell size, see cell_stats
+    #
+    # Outputs:  features    - dict of feature arrays, see image_cell_stats
+    #
+
+    return source_features(FileSource([img_path]), 0, cache_dir=cache_dir,
+                           labelled=labelled, min_size=min_size)
+
+
+def source_features(source, i, cache_dir=None, labelled=False, min_size=50):
+
+    # source_features
+    # Return the cell features of one frame of a frame source. If a cache
+    # directory is given features are read from there when the frame is
+    # unchanged, otherwise they are extracted from the image and then
+    # cached.
+    #
+    # Inputs:   source      - frame source
+    #           i           - frame index
+    #           cache_dir   - optional directory for on-disk feature cache
+    #           labelled    - frames are label images, see cell_stats
+    #           min_size    - minimum cell size, see cell_stats
+    #
+    # Outputs:  features    - dict of feature arrays, see image_cell_stats
+    #
+
+    if cache_dir is None:
+        return cell_stats(source.read(i), labelled=labelled,
+                          min_size=min_size)
+
+    # Features depend on the extraction options as well as the frame
+    key = source.cache_key(i)
+    if labelled or min_size != 50:
+        key += '|' + repr((labelled, min_size))
+    cache_file = key_path(key, cache_dir)
+
+    # Cache hit, skip image decoding entirely
+    if os.path.isfile(cache_file):
+        data = np.load(cache_file)
+        features = {key: data[key] for key in FEATURE_KEYS}
+        features['img_shape'] = tuple(data['img_shape'].tolist())
+        data.close()
+
+        return features
+
+    # Cache miss, extract and store
+    features = cell_stats(source.read(i), labelled=labelled,
+                          min_size=min_size)
+
+    # Another thread or process may create the directory at the same time
+    if not os.path.isdir(cache_dir):
+        try:
+            os.makedirs(cache_dir)
+        except OSError:
+            if not os.path.isdir(cache_dir):
+                raise
+
+    # Write to temporary file first so an interrupted run can't leave a
+    # truncated cache entry behind
+    tmp_file = cache_file + '.tmp.npz'
+    np.savez(tmp_file, img_shape=np.asarray(features['img_shape']),
+             **{key: features[key] for key in FEATURE_KEYS})
+    os.rename(tmp_file, cache_file)
+
+    return features
+
+
+def cell_stats(img, labelled=False, min_size=50):
+
+    # cell_stats
+    # Cell features of an image, either a pre-segmented (binary) image that
+    # is labelled here or a label image from the segmentation
+    #
+    # Inputs:   img         - image data
+    #           labelled    - img is a label image, each cell has its own
+    #                         integer label and background is 0
+    #           min_size    - cells with filled area (area for label
+    #                         images) of min_size or less are discarded as
+    #                         segmented debris
+    #
+    # Outputs:  out         - dict of feature arrays, see image_cell_stats
+    #
+
+    if labelled:
+        return label_cell_stats(img, min_size=min_size)
+
+    return image_cell_stats(img, min_size=min_size)
+
+
+def image_cell_stats(img, min_size=50):
+
+    # image_cell_stats
+    # Function labels the cells of a pre-segmented image. The features are
+    # extracted from the labelled image.
+    #
+    # Inputs:   img         - image data
+    #           min_size    - minimum filled area of a cell
+    #
+    # Outputs:  out         - dict of feature arrays, one row per cell
+    #                         centroid     (n x 2 float)
+    #                         area         (n int)
+    #                         filled_area  (n int)
+    #                         bbox         (n x 4 int)
+    #                         img_shape    (tuple)
+    #
+
+    # Label pre-segmented image
+    img_label = label(img)
+
+    # Collect cell features if cell is of minimum size (not segmented debris)
+    cells = [cell for cell in regionprops(img_label)
+             if cell['filled_area'] > min_size]
+
+    # Output
+    out = {'centroid': np.array([cell.centroid for cell in cells],
+                                dtype=float).reshape(-1, 2),
+           'area': np.array([cell.area for cell in cells], dtype=int),
+           'filled_area': np.array([cell.filled_area for cell in cells],
+                                   dtype=int),
+           'bbox': np.array([cell.bbox for cell in cells],
+                            dtype=int).reshape(-1, 4),
+           'img_shape': img.shape}
+
+    return out
+
+
+def label_cell_stats(img_label, min_size=50):
+
+    # label_cell_stats
+    # Cell features of a label image, found for all labels at once from
+    # label counts and moments rather than region by region. Labels are used
+    # as given, with no relabelling, and holes are not filled so the filled
+    # area of a cell is its area.
+    #
+    # Inputs:   img_label   - label image, background 0
+    #           min_size    - minimum area of a cell
+    #
+    # Outputs:  out         - dict of feature arrays, as image_cell_stats,
+    #                         cells in label order
+    #
+
+    img_label = np.asarray(img_label)
+    flat = img_label.ravel().astype(np.intp)
+    n_labels = int(flat.max()) + 1 if flat.size else 1
+
+    # Zeroth and first moments of each label
+    rows, cols = np.indices(img_label.shape)
+    area = np.bincount(flat, minlength=n_labels)
+    row_sum = np.bincount(flat, weights=rows.ravel(), minlength=n_labels)
+    col_sum = np.bincount(flat, weights=cols.ravel(), minlength=n_labels)
+
+    # Cells of minimum size, label 0 is background
+    cells = np.flatnonzero(area > min_size)
+    cells = cells[cells > 0]
+
+    # Bounding boxes, one slice pair per label
+    objects = ndimage.find_objects(img_label.astype(np.intp))
+    bbox = [(objects[c-1][0].start, objects[c-1][1].start,
+             objects[c-1][0].stop, objects[c-1][1].stop)
+            for c in cells.tolist()]
+
+    # Output
+    out = {'centroid': np.column_stack((row_sum[cells] / area[cells],
+                                        col_sum[cells] / area[cells])),
+           'area': area[cells].astype(int),
+           'filled_area': area[cells].astype(int),
+           'bbox': np.array(bbox, dtype=int).reshape(-1, 4),
+           'img_shape': img_label.shape}
+
+    return out
+
+
+def cache_path(img_path, cache_dir):
+
+    # cache_path
+    # Location of the cached features for an image. Keyed on the absolute
+    # file path and modification time so edited images are re-extracted.
+    #
+    # Inputs:   img_path    - path to image file
+    #           cache_dir   - directory for on-disk feature cache
+    #
+    # Outputs:  path to cache file
+    #
+
+    return key_path(FileSource([img_path]).cache_key(0), cache_dir)
+
+
+def key_path(key, cache_dir):
+
+    # key_path
+    # Location of the cached features for a frame cache key
+    #
+    # Inputs:   key         - frame cache key, see the frame sources
+    #           cache_dir   - directory for on-disk feature cache
+    #
+    # Outputs:  path to cache file
+    #
+
+    key = hashlib.sha1(key.encode('utf-8'))
+
+    return os.path.join(cache_dir, key.hexdigest() + '.npz')
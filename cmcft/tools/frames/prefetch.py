@@ -0,0 +1,74 @@
+# prefetch.py
+# Read-ahead of frame features: decoding, labelling and feature extraction
+# of the next frames run in a pool while the caller works on the current
+# frame, e.g. while a frame pair is being solved.
+
+# Import external packages
+import collections
+import multiprocessing
+import multiprocessing.pool
+
+# Import functions
+from features import source_features
+from sources import open_source
+
+__all__ = ['prefetch_features']
+
+
+def prefetch_features(frames, depth=2, pool='thread', workers=None, start=0,
+                      **feature_options):
+
+    # prefetch_features
+    # Generator over the features of an ordered sequence of frames, as
+    # sequence_features, with the features of up to depth frames ahead
+    # being extracted in a pool at any time. Frames are only submitted as
+    # earlier ones are taken, so no more than depth frames (and their
+    # features) are held at once.
+    #
+    # Inputs:   frames      - frame source, or path/list of image files
+    #                         (see open_source)
+    #           depth       - number of frames extracted ahead
+    #           pool        - 'thread' for a thread pool (decoding and
+    #                         labelling release the GIL for much of their
+    #                         work) or 'process' for a process pool
+    #           workers     - pool size, by default depth
+    #           start       - index of first frame
+    #           feature_options - source_features keyword arguments
+    #                         (cache_dir, labelled, min_size)
+    #
+    # Outputs:  (name, features) tuple for each frame in turn
+    #
+
+    source = open_source(frames)
+    depth = max(int(depth), 1)
+
+    if pool == 'thread':
+        workers_pool = multiprocessing.pool.ThreadPool(workers or depth)
+    elif pool == 'process':
+        workers_pool = multiprocessing.Pool(workers or depth)
+    else:
+        raise ValueError('Unknown prefetch pool: ' + str(pool))
+
+    # Frames submitted and not yet taken, in frame order
+    pending = collections.deque()
+    indices = iter(xrange(start, len(source)))
+
+    def submit():
+        i = next(indices, None)
+        if i is not None:
+            pending.append((i, workers_pool.apply_async(
+                source_features, (source, i), feature_options)))
+
+    try:
+        for _ in xrange(depth):
+            submit()
+
+        while pending:
+            i, result = pending.popleft()
+            submit()
+            yield source.name(i), result.get()
+
+        workers_pool.close()
+    finally:
+        workers_pool.terminate()
+        workers_pool.join()
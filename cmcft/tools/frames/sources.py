@@ -0,0 +1,227 @@
+# sources.py
+# Frame sources, sequences of image frames read lazily one frame at a time
+# from a directory of images, a multi-page TIFF or a .npy/raw array file
+
+# Import external packages
+import glob
+import os
+import threading
+import numpy as np
+import skimage.io
+
+try:
+    import tifffile
+except ImportError:
+    from skimage.external import tifffile
+
+__all__ = ['FileSource', 'TiffStackSource', 'ArraySource', 'open_source']
+
+
+class FileSource(object):
+
+    # FileSource
+    # Frames held one per image file
+    #
+    # Attributes:   files   - list of image file paths, in frame order
+    #
+
+    def __init__(self, files):
+
+        self.files = list(files)
+
+    def __len__(self):
+
+        return len(self.files)
+
+    def read(self, i):
+
+        # read
+        # Image data of frame i
+
+        return skimage.io.imread(self.files[i])
+
+    def name(self, i):
+
+        # name
+        # Name of frame i, its file path
+
+        return self.files[i]
+
+    def cache_key(self, i):
+
+        # cache_key
+        # Key of frame i for the feature cache, changes when the file does
+
+        path = os.path.abspath(self.files[i])
+
+        return path + '|' + repr(os.stat(path).st_mtime)
+
+
+class TiffStackSource(object):
+
+    # TiffStackSource
+    # Frames held as the pages of one multi-page TIFF. Each frame is decoded
+    # from its own page when read, the rest of the stack is not loaded.
+    # Reads share one file handle, so are serialised when frames are read
+    # from several threads.
+    #
+    # Attributes:   path    - path of TIFF file
+    #
+
+    def __init__(self, path):
+
+        self.path = path
+        self._tif = None
+        self._lock = threading.Lock()
+        self._n = len(self.tif().pages)
+
+    def tif(self):
+
+        # tif
+        # Open TIFF file, opened on first use (and again after pickling)
+
+        if self._tif is None:
+            self._tif = tifffile.TiffFile(self.path)
+
+        return self._tif
+
+    def __len__(self):
+
+        return self._n
+
+    def read(self, i):
+
+        with self._lock:
+            return self.tif().asarray(key=i)
+
+    def name(self, i):
+
+        return self.path + '#' + str(i)
+
+    def cache_key(self, i):
+
+        path = os.path.abspath(self.path)
+
+        return path + '|' + repr(os.stat(path).st_mtime) + '|' + str(i)
+
+    def __getstate__(self):
+
+        # File handle is not passed to worker processes
+        state = self.__dict__.copy()
+        state['_tif'] = None
+        state['_lock'] = None
+
+        return state
+
+    def __setstate__(self, state):
+
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+class ArraySource(object):
+
+    # ArraySource
+    # Frames held as a (frames x height x width) array in a .npy file or a
+    # raw binary file, memory mapped so only the frames read are loaded.
+    # Raw files need the frame shape and data type, the number of frames is
+    # found from the file size.
+    #
+    # Attributes:   path    - path of array file
+    #               shape   - frame shape (raw files only)
+    #               dtype   - data type (raw files only)
+    #               offset  - header bytes before the data (raw files only)
+    #
+
+    def __init__(self, path, shape=None, dtype=None, offset=0):
+
+        self.path = path
+        self.shape = shape
+        self.dtype = dtype
+        self.offset = offset
+        self._data = None
+        self._n = len(self.data())
+
+    def data(self):
+
+        # data
+        # Memory map of the array file, opened on first use (and again after
+        # pickling)
+
+        if self._data is None:
+            if self.path.endswith('.npy'):
+                self._data = np.load(self.path, mmap_mode='r')
+            else:
+                if self.shape is None or self.dtype is None:
+                    raise ValueError('Frame shape and dtype are needed to '
+                                     'read raw file: ' + self.path)
+                frame_bytes = (np.dtype(self.dtype).itemsize *
+                               int(np.prod(self.shape)))
+                n = (os.path.getsize(self.path) - self.offset) // frame_bytes
+                self._data = np.memmap(self.path, dtype=self.dtype, mode='r',
+                                       offset=self.offset,
+                                       shape=(n,) + tuple(self.shape))
+
+        return self._data
+
+    def __len__(self):
+
+        return self._n
+
+    def read(self, i):
+
+        return np.array(self.data()[i])
+
+    def name(self, i):
+
+        return self.path + '#' + str(i)
+
+    def cache_key(self, i):
+
+        path = os.path.abspath(self.path)
+
+        return path + '|' + repr(os.stat(path).st_mtime) + '|' + str(i)
+
+    def __getstate__(self):
+
+        # Memory map is not passed to worker processes
+        state = self.__dict__.copy()
+        state['_data'] = None
+
+        return state
+
+
+def open_source(frames, pattern='*.tif', shape=None, dtype=None):
+
+    # open_source
+    # Frame source for a directory of images, a multi-page TIFF, a .npy
+    # file, a raw file or a list of image files
+    #
+    # Inputs:   frames      - path, list of image files or a frame source
+    #                         (returned unchanged)
+    #           pattern     - glob pattern of image files in a directory
+    #           shape       - frame shape of a raw file
+    #           dtype       - data type of a raw file
+    #
+    # Outputs:  source      - frame source
+    #
+
+    if hasattr(frames, 'read'):
+        return frames
+
+    if isinstance(frames, (list, tuple)):
+        return FileSource(frames)
+
+    if os.path.isdir(frames):
+        # In order of file name, as watch, whatever the filesystem's order
+        return FileSource(sorted(glob.glob(os.path.join(frames, pattern))))
+
+    ext = os.path.splitext(frames)[1].lower()
+
+    if ext in ('.tif', '.tiff'):
+        return TiffStackSource(frames)
+
+    if ext == '.npy' or shape is not None:
+        return ArraySource(frames, shape=shape, dtype=dtype)
+
+    raise ValueError('Unknown frame source: ' + str(frames))
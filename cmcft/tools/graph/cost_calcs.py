@@ -1,151 +1,123 @@
 # cost_calcs.py
 # Set of functions used to calculate costs elements between nodes
 
-import math
+import numpy as np
 
-__all__ = ['closest_border', 'dist_calc', 'area_diff', 'split_cost',
-           'merge_cost', 'extract_num', ]
+__all__ = ['dist_matrix', 'area_diff_matrix', 'border_dist', 'pair_costs',
+           'event_costs']
 
 
-def closest_border(g, cell):
+def dist_matrix(c1, c2):
 
-    # closest_border
-    # Finds the distance from given cell to the border of the image.
-    # Note that image dimensions are measured from top left hand corner.
+    # dist_matrix
+    # Euclidean distance between every pair of centroids of two sets.
     #
-    # inputs:   cell        - label of cell in question
-    #           img_shape   - image dimensions. (x, y) Tuple.
+    # Inputs:   c1  - (n1 x 2) array of centroids
+    #           c2  - (n2 x 2) array of centroids
     #
-    # outputs:  dist - distance to the closest border
+    # Outputs:  dist - (n1 x n2) array of distances
     #
 
-    # Data
-    node_x = g.node[cell]['centroid'][0]
-    node_y = g.node[cell]['centroid'][1]
-
-    # Distances from borders
-    x_dist_r = abs(g.graph['img_shape'][0] - node_x)
-    y_dist_b = abs(g.graph['img_shape'][1] - node_y)
-
-    # Closest border
-    dist = min(node_x, x_dist_r, node_y, y_dist_b)
+    x_distance = c2[np.newaxis, :, 0] - c1[:, np.newaxis, 0]
+    y_distance = c2[np.newaxis, :, 1] - c1[:, np.newaxis, 1]
+    dist = np.sqrt(x_distance * x_distance + y_distance * y_distance)
 
     return dist
 
 
-def dist_calc(g_nodes, node1, node2):
+def area_diff_matrix(a1, a2):
 
-    # dist_calc
-    # Calculate the Euclidean distance between two nodes.
+    # area_diff_matrix
+    # Square root of the absolute difference in area between every pair
+    # of areas of two sets.
     #
-    # Inputs:   g_nodes - nodes in graph structure with associated attributes
-    #           node1   - label of node 1
-    #           node2   - label of node 2
+    # Inputs:   a1  - (n1) array of areas
+    #           a2  - (n2) array of areas
     #
+    # Outputs:  area_difference - (n1 x n2) array
     #
-    # Outputs:  dist - distance value (Float)
-    #
-
-    x1, y1 = g_nodes[node1]['centroid']
-    x2, y2 = g_nodes[node2]['centroid']
 
-    x_distance = float(x2) - float(x1)
-    y_distance = float(y2) - float(y1)
-    distance = math.sqrt(math.pow(x_distance, 2) + math.pow(y_distance, 2))
+    diff = np.abs(a2[np.newaxis, :] - a1[:, np.newaxis])
+    area_difference = np.sqrt(diff.astype(float))
 
-    return distance
+    return area_difference
 
 
-def area_diff(area1, area2):
+def border_dist(centroids, img_shape):
 
-    # area_diff
-    # Calculate the absolute difference in area between two nodes.
+    # border_dist
+    # Distance from each centroid to the closest border of the image.
+    # Note that image dimensions are measured from top left hand corner.
     #
-    # Inputs:   area1   -    area of node 1
-    #           area2   -    area of node 2
+    # Inputs:   centroids   - (n x 2) array of centroids
+    #           img_shape   - image dimensions. (x, y) Tuple.
     #
-    # Outputs:  area_difference - distance value. Float
+    # Outputs:  dist - (n) array of distances to the closest border
     #
 
-    area_difference = math.sqrt(abs(area2 - area1))
+    node_x = centroids[:, 0]
+    node_y = centroids[:, 1]
 
-    return area_difference
+    dist = np.vstack((node_x, np.abs(img_shape[0] - node_x),
+                      node_y, np.abs(img_shape[1] - node_y))).min(axis=0)
 
+    return dist
 
-def split_cost(g_nodes, node, event):
 
-    # split_cost
-    # Calculate the association 'cost' for a cell splitting
+def pair_costs(centroids, areas, pairs):
+
+    # pair_costs
+    # Cost of pairs of cells from the same frame being a split/merge event,
+    # the distance between the cells normalised by their summed area.
+    #
+    # Inputs:   centroids   - (n x 2) array of centroids
+    #           areas       - (n) array of areas
+    #           pairs       - (p x 2) array of cell indices
     #
-    # Inputs:   g_nodes -   nodes in graph with associated attributes
-    #           node    -   cell in question
-    #           event   -   label of split node
+    # Outputs:  cost        - (p) array of pair costs
     #
-    # Outputs:  cost    - association cost
 
-    # Daughter cells
-    d_cells = [('R' + str(s)) for s in extract_num(event)]
+    c1 = centroids[pairs[:, 0]]
+    c2 = centroids[pairs[:, 1]]
 
-    # Centroid distance feature
-    dist = [dist_calc(g_nodes, node, d) for d in d_cells]
-    dist_cost = sum(dist)
+    x_distance = c2[:, 0] - c1[:, 0]
+    y_distance = c2[:, 1] - c1[:, 1]
+    dist = np.sqrt(x_distance * x_distance + y_distance * y_distance)
 
-    # Area difference feature
-    split_area = sum(g_nodes[d]['area'] for d in d_cells)
-    area_cost = area_diff(split_area, g_nodes[node]['area'])
-
-    cost = int(dist_cost + area_cost)
+    cost = dist / (areas[pairs[:, 0]] + areas[pairs[:, 1]])
 
     return cost
 
 
-def merge_cost(g_nodes, node, event):
+def event_costs(centroids, areas, pair_centroids, pair_areas, pairs,
+                dist=None):
 
-    # merge_cost
-    # Calculate the association 'cost' for a cell resulting from a merge
+    # event_costs
+    # Cost of each cell associating with each pair of cells in the other
+    # frame, i.e. splitting into or merging from the pair: the summed
+    # distance to the pair plus the area difference.
     #
-    # Inputs:   g_nodes -   nodes in graph with associated attributes
-    #           node    -   cell in question
-    #           event   -   label of merge node
+    # Inputs:   centroids       - (n x 2) centroids of the single cells
+    #           areas           - (n) areas of the single cells
+    #           pair_centroids  - (m x 2) centroids of cells forming pairs
+    #           pair_areas      - (m) areas of cells forming pairs
+    #           pairs           - (p x 2) array of indices into pair cells
+    #           dist            - optional (n x m) dist_matrix of the
+    #                             single and pair cell centroids, if
+    #                             already computed
+    #
+    # Outputs:  cost            - (n x p) integer array of costs
     #
-    # Outputs:  cost    - association cost
-
-    # Daughter/parent cells
-    p_cells = [('L' + str(s)) for s in extract_num(event)]
 
     # Centroid distance feature
-    dist = [dist_calc(g_nodes, node, p) for p in p_cells]
-    dist_cost = sum(dist)
+    if dist is None:
+        dist = dist_matrix(centroids, pair_centroids)
+    dist_cost = dist[:, pairs[:, 0]] + dist[:, pairs[:, 1]]
 
     # Area difference feature
-    merge_area = sum(g_nodes[p]['area'] for p in p_cells)
-    area_cost = area_diff(merge_area, g_nodes[node]['area'])
+    pair_area = pair_areas[pairs[:, 0]] + pair_areas[pairs[:, 1]]
+    area_cost = area_diff_matrix(areas, pair_area)
 
-    cost = int(dist_cost + area_cost)
+    cost = (dist_cost + area_cost).astype(int)
 
     return cost
-
-
-def extract_num(node_label):
-
-    # extract_node_number
-    # Extract the node numbers from the cell label as a set
-    #
-    # Inputs: node_label    - node label (string)
-    # Outputs: numbers      - set of node numbers in label
-    #
-
-    # Initialise set
-    numbers = set()
-
-    # If merge/split node then partition at ,
-    partition = node_label.partition(',')
-
-    # Add each number to set
-    numbers.add(int(''.join(i for i in partition[0] if i.isdigit())))
-    try:
-        numbers.add(int(''.join(i for i in partition[2] if i.isdigit())))
-    except ValueError:
-        pass
-
-    return numbers
@@ -1,11 +1,20 @@
 # edges.py
 # Functions used to build edges in graph structure
 
+# Import external packages
+import numpy as np
+
 # Import functions
 from cost_calcs import *
+from selection import lowest
+from vertices import L, R, A, D, S, M
+
+# Largest number of split/merge costs computed at once, the full (cells x
+# pairs) matrix can run to several GB for large frames
+CHUNK_SIZE = 2 ** 22
 
 
-def build(g_in, w, alpha):
+def build(g_in, w, alpha, max_edges=None):
 
     # build
     # Create the edges for the graph structure. Edge weights are
@@ -16,6 +25,7 @@ def build(g_in, w, alpha):
     #           w       - feature weights (set empirically)
     #           alpha   - pruning parameter, fraction of lowest cost
     #                     edges to retain
+    #           max_edges - optional cap on pruned edges retained per node
     # Outputs:  g_out   - updated graph with the correct edges added
     #
 
@@ -23,19 +33,23 @@ def build(g_in, w, alpha):
     dummy_cost = 0
 
     # ------------------------------------------------------------------------
-    # Create useful subset dicts of nodes
-    node_sets = {'l_n': [], 'r_n': [], 's_n': [], 'm_n': []}
-
-    for label in g_in.nodes():
-
-        if 'L' in label:
-            node_sets['l_n'].append(label)
-        elif 'R' in label:
-            node_sets['r_n'].append(label)
-        elif 'S' in label:
-            node_sets['s_n'].append(label)
-        elif 'M' in label:
-            node_sets['m_n'].append(label)
+    # Vertex table, cell feature arrays and split/merge pairs set by
+    # nodes.build. Edges are built between integer vertex IDs.
+    table = g_in.graph['vertices']
+    l_cells = g_in.graph['l_cells']
+    r_cells = g_in.graph['r_cells']
+    s_pairs = g_in.graph['s_pairs']
+    m_pairs = g_in.graph['m_pairs']
+
+    l_n = table.ids(L)
+    r_n = table.ids(R)
+    s_n = table.ids(S)
+    m_n = table.ids(M)
+    a_n = table.ids(A)
+    d_n = table.ids(D)
+
+    # Edges are collected as (source, target, weight) arrays
+    edge_sets = []
 
     # ------------------------------------------------------------------------
     # Running through the sets, build the edges.
@@ -43,131 +57,198 @@ def build(g_in, w, alpha):
     #
     # -----
     # FROM split edges
-    for s_node in node_sets['s_n']:
-        # TO R nodes
-        for r_node in node_sets['r_n']:
-            if extract_num(r_node).intersection(extract_num(s_node)):
-                g_in.add_edge(s_node, r_node, weight=dummy_cost)
+    # TO R nodes
+    edge_sets.append(fixed_edges(np.repeat(s_n, 2), r_n[s_pairs.ravel()],
+                                 dummy_cost))
 
     #
     # -----
     # FROM merge edges
-    for m_node in node_sets['m_n']:
+    # TO R nodes
+    dist = dist_matrix(r_cells['centroid'], l_cells['centroid'])
 
-        # TO R nodes
-        merge_edges = []
-        for r_node in node_sets['r_n']:
-            cost = w * merge_cost(g_in.node, r_node, m_node)
-            merge_edges.append((m_node, r_node, cost))
+    def merge_costs(rows):
+        return w * event_costs(r_cells['centroid'], r_cells['area'],
+                               l_cells['centroid'], l_cells['area'],
+                               m_pairs[rows], dist=dist).T
 
-        # Prune and add subset of edges to graph
-        edges_to_add = prune_set(merge_edges, alpha=alpha)
-        g_in.add_weighted_edges_from(edges_to_add)
+    # Prune and retain subset of edges, a chunk of merge vertices at a time
+    edge_sets.append(chunked_pruned_edges(m_n, r_n, merge_costs, alpha,
+                                          max_edges=max_edges))
 
-        # TO disappear node
-        g_in.add_edge(m_node, 'D', weight=dummy_cost)
+    # TO disappear node
+    edge_sets.append(fixed_edges(m_n, np.repeat(d_n, len(m_n)), dummy_cost))
 
     #
     # -----
     # FROM appear node
     # TO split nodes
-    for s_node in node_sets['s_n']:
-        g_in.add_edge('A', s_node, weight=dummy_cost)
+    edge_sets.append(fixed_edges(np.repeat(a_n, len(s_n)), s_n, dummy_cost))
 
     # TO disappear node
-    g_in.add_edge('A', 'D', weight=dummy_cost)
+    edge_sets.append(fixed_edges(a_n, d_n, dummy_cost))
 
     # TO R nodes
-    appear_edges = []
-    for r_node in node_sets['r_n']:
-        # find closest border
-        dist_border = closest_border(g_in, r_node)
-
-        # Feature costs: Movement and Change in Area
-        move_c = w * dist_border
-        area_c = w * area_diff(g_in.node[r_node]['area'], g_in.node['A']['area'])
-        cost = int(area_c + move_c)
+    # Feature costs: Movement (closest border) and Change in Area
+    move_c = w * border_dist(r_cells['centroid'], g_in.graph['img_shape'])
+    area_c = w * area_diff_matrix(np.array([g_in.node['A']['area']]),
+                                  r_cells['area'])[0]
+    appear_costs = (area_c + move_c).astype(int)
 
-        appear_edges.append(('A', r_node, cost))
-
-    # Prune and add subset of edges to graph
-    edges_to_add = prune_set(appear_edges, alpha=alpha)
-    g_in.add_weighted_edges_from(edges_to_add)
+    # Prune and retain subset of edges
+    edge_sets.append(pruned_edges(a_n, r_n, appear_costs[np.newaxis, :],
+                                  alpha))
 
     #
     # -----
     # FROM L nodes
-    disappear_edges = []
-    for l_node in node_sets['l_n']:
+    # TO R nodes - simple move edges
+    # Feature costs: Movement and Change in Area
+    move_c = w * dist_matrix(l_cells['centroid'], r_cells['centroid'])
+    area_c = w * area_diff_matrix(l_cells['area'], r_cells['area'])
+    move_costs = (move_c + area_c).astype(int)
+
+    # Prune and retain subset of edges
+    edge_sets.append(pruned_edges(l_n, r_n, move_costs, alpha,
+                                  max_edges=max_edges))
+
+    # TO disappear
+    # Feature costs: Movement (closest border) and Change in Area
+    move_c = w * border_dist(l_cells['centroid'], g_in.graph['img_shape'])
+    area_c = w * area_diff_matrix(np.array([g_in.node['D']['area']]),
+                                  l_cells['area'])[0]
+    disappear_costs = (area_c + move_c).astype(int)
+
+    # Prune and retain subset of edges
+    edge_sets.append(pruned_edges(d_n, l_n, disappear_costs[np.newaxis, :],
+                                  alpha, transpose=True))
+
+    # TO split edges
+    dist = dist_matrix(l_cells['centroid'], r_cells['centroid'])
+
+    def split_costs(rows):
+        return w * event_costs(l_cells['centroid'][rows],
+                               l_cells['area'][rows],
+                               r_cells['centroid'], r_cells['area'],
+                               s_pairs, dist=dist[rows])
+
+    # Prune and retain subset of edges, a chunk of L cells at a time
+    edge_sets.append(chunked_pruned_edges(l_n, s_n, split_costs, alpha,
+                                          max_edges=max_edges))
+
+    # TO merge edges
+    edge_sets.append(fixed_edges(l_n[m_pairs.ravel()], np.repeat(m_n, 2),
+                                 dummy_cost))
 
-        # TO R nodes - simple move edges
-        move_edges = []
-        for r_node in node_sets['r_n']:
+    # ------------------------------------------------------------------------
+    # Store edge arrays and add edges to graph
+    source, target, weight = [np.concatenate(e).astype(int)
+                              for e in zip(*edge_sets)]
+    g_in.graph['edges'] = {'source': source,
+                           'target': target,
+                           'weight': weight}
 
-            # Feature costs: Movement and Change in Area
-            move_c = w * dist_calc(g_in.node, l_node, r_node)
-            area_c = w * area_diff(g_in.node[l_node]['area'], g_in.node[r_node]['area'])
-            cost = int(move_c + area_c)
+    g_in.add_weighted_edges_from(zip([table[v] for v in source.tolist()],
+                                     [table[v] for v in target.tolist()],
+                                     weight.tolist()))
 
-            move_edges.append((l_node, r_node, cost))
+    # ------------------------------------------------------------------------
+    # prepare output
+    g_out = g_in
 
-        # Prune and add subset of edges to graph
-        edges_to_add = prune_set(move_edges, alpha=alpha)
-        g_in.add_weighted_edges_from(edges_to_add)
+    return g_out
 
-        # TO disappear
-        # find closest border
-        dist_border = closest_border(g_in, l_node)
 
-        # Feature costs: Movement and Change in Area
-        move_c = w * dist_border
-        area_c = w * area_diff(g_in.node[l_node]['area'], g_in.node[r_node]['area'])
-        cost = int(area_c + move_c)
+def fixed_edges(source, target, cost):
 
-        disappear_edges.append((l_node, 'D', cost))
+    # fixed_edges
+    # Edges that are always added, all with the same cost
+    #
+    # Inputs:   source  -   array of source vertex IDs
+    #           target  -   array of target vertex IDs
+    #           cost    -   edge weight
+    #
+    # Outputs:  (source, target, weight) arrays
+    #
 
-        # TO split edges
-        split_edges = []
-        for s_node in node_sets['s_n']:
-            cost = w * split_cost(g_in.node, l_node, s_node)
-            split_edges.append((l_node, s_node, cost))
+    return source, target, np.repeat(cost, len(source))
 
-        # Prune and add subset of edges to graph
-        edges_to_add = prune_set(split_edges, alpha=alpha)
-        g_in.add_weighted_edges_from(edges_to_add)
 
-        # TO merge edges
-        for m_node in node_sets['m_n']:
-            if extract_num(m_node).intersection(extract_num(l_node)):
-                g_in.add_edge(l_node, m_node, weight=dummy_cost)
+def pruned_edges(row_n, col_n, costs, alpha, transpose=False,
+                 max_edges=None):
 
-    # Prune and add subset of edges to graph
-    edges_to_add = prune_set(disappear_edges, alpha=alpha)
-    g_in.add_weighted_edges_from(edges_to_add)
+    # pruned_edges
+    # Prune each row of a cost matrix and return the retained edges
+    #
+    # Inputs:   row_n       -   vertex IDs of the rows of the cost matrix
+    #           col_n       -   vertex IDs of the columns of the cost matrix
+    #           costs       -   (rows x columns) cost matrix
+    #           alpha       -   proportion of each row to retain
+    #           transpose   -   edges go from the columns to the rows
+    #           max_edges   -   optional cap on edges retained per row
+    #
+    # Outputs:  (source, target, weight) arrays
+    #
 
-    # ------------------------------------------------------------------------
-    # prepare output
-    g_out = g_in
+    retain = prune_set(costs, alpha, max_edges=max_edges)
 
-    return g_out
+    rows = np.repeat(np.arange(costs.shape[0]), retain.shape[1])
+    cols = retain.ravel()
 
+    if transpose:
+        return col_n[cols], row_n[rows], costs[rows, cols]
 
-def prune_set(edges, alpha):
+    return row_n[rows], col_n[cols], costs[rows, cols]
 
-    # prune_set
-    # Sorts the edges in order of increasing cost a returns set to be added
+
+def chunked_pruned_edges(row_n, col_n, row_costs, alpha, max_edges=None,
+                         chunk_size=CHUNK_SIZE):
+
+    # chunked_pruned_edges
+    # pruned_edges for a cost matrix built a block of rows at a time, so
+    # no more than about chunk_size costs are held at once. Rows are pruned
+    # independently, so the edges are the same as for the full matrix.
     #
-    # Inputs:   edges   -   list of edges
-    #           alpha   -   proportion to retain
+    # Inputs:   row_n       -   vertex IDs of the rows of the cost matrix
+    #           col_n       -   vertex IDs of the columns of the cost matrix
+    #           row_costs   -   function giving the (rows x columns) cost
+    #                           matrix of a slice of rows
+    #           alpha       -   proportion of each row to retain
+    #           max_edges   -   optional cap on edges retained per row
+    #           chunk_size  -   number of costs computed at once
     #
-    # Outputs:  add_edges  -   list of edges to be added
+    # Outputs:  (source, target, weight) arrays
     #
 
-    # Sort by order of increasing cost
-    edges.sort(key=lambda tup: tup[2])
+    n_rows = max(chunk_size // max(len(col_n), 1), 1)
+
+    edges = [pruned_edges(row_n[rows], col_n, row_costs(rows), alpha,
+                          max_edges=max_edges)
+             for rows in (slice(start, start + n_rows)
+                          for start in xrange(0, max(len(row_n), 1),
+                                              n_rows))]
+
+    return tuple(np.concatenate(e) for e in zip(*edges))
+
+
+def prune_set(costs, alpha, max_edges=None):
+
+    # prune_set
+    # Selects the lowest cost entries of each row of a cost matrix as the
+    # columns to be retained. Uses partial selection, no full sort.
+    #
+    # Inputs:   costs       -   (rows x columns) cost matrix
+    #           alpha       -   proportion of each row to retain
+    #           max_edges   -   optional cap on entries retained per row
+    #
+    # Outputs:  retain      -   (rows x k) array of column indices to retain
+    #
 
     # Retain required proportion of edges with lowest cost
-    retain_index = int(round(alpha * len(edges)))
-    add_edges = edges[:retain_index]
+    retain_index = int(round(alpha * costs.shape[1]))
+    if max_edges is not None:
+        retain_index = min(retain_index, max_edges)
+
+    retain = lowest(costs, retain_index)
 
-    return add_edges
+    return retain
@@ -2,11 +2,14 @@
 # Functions to build nodes in graph structure.
 
 # Import external packages
-from itertools import combinations
+import numpy as np
+from scipy.spatial import cKDTree
 from cost_calcs import *
+from selection import lowest
+from vertices import S, vertex_table
 
 
-def build(g, l_cells, r_cells, beta):
+def build(g, l_cells, r_cells, beta, radius=None, k=None):
 
     # build
     # Initialise the required nodes for the graph structure.
@@ -15,42 +18,32 @@ def build(g, l_cells, r_cells, beta):
     # fraction (beta) of the R/L cells with the lowest cost, where the cost
     # of a pair of cells is defined by the distance of the cells from each
     # other normalised by their size.
+    #
+    # Only pairs of cells within radius of each other, and/or amongst each
+    # other's k nearest neighbours, are proposed as split/merge candidates.
+    # By default all pairs are candidates.
 
     #
     # Inputs:   g       - initialised graph structure to build upon
-    #           l_cells - cells and corresponding feature data first image
-    #           r_cells - cells and corresponding feature data second
+    #           l_cells - dict of cell feature arrays for first image
+    #           r_cells - dict of cell feature arrays for second image
     #           beta    - pruning coefficient for split/merge events
+    #           radius  - optional maximum distance between paired cells
+    #           k       - optional number of nearest neighbours to pair with
     #
     # Outputs:  g_out   - graph structure with required nodes added.
     #                     nodes have required feature attributes assigned
 
     # --------
     # Cells in previous image
-    l_nodes = {}
-    l_area_sum = 0
-    for cell in l_cells:
-        label = 'L' + str(len(l_nodes)+1)
-        l_nodes[label] = {'centroid': cell.centroid,
-                          'area': cell.area,
-                          'bbox': cell.bbox}
-
-        # keep track of l cell area sum
-        l_area_sum = l_area_sum + cell.filled_area
+    l_nodes = cell_nodes('L', l_cells)
+    l_area_sum = int(l_cells['filled_area'].sum())
 
     g.add_nodes_from(l_nodes.iteritems())
 
     # Cells in current image
-    r_nodes = {}
-    r_area_sum = 0
-    for cell in r_cells:
-        label = 'R' + str(len(r_nodes)+1)
-        r_nodes[label] = {'centroid': cell.centroid,
-                          'area': cell.area,
-                          'bbox': cell.bbox}
-
-        # keep track of r cell area sum
-        r_area_sum = r_area_sum + cell.filled_area
+    r_nodes = cell_nodes('R', r_cells)
+    r_area_sum = int(r_cells['filled_area'].sum())
 
     g.add_nodes_from(r_nodes.iteritems())
 
@@ -65,56 +58,133 @@ def build(g, l_cells, r_cells, beta):
     g.add_node('D', area=disappear_area)
 
     # --------
-    # Split nodes
-    s_n = []
-    split_into = range(1, (len(r_nodes)+1))
-    for subset in combinations(split_into, 2):
-        label = "S(" + str(subset[0]) + "," + str(subset[1]) + ")"
-        cost = event_cost(g, ('R' + str(subset[0])), ('R' + str(subset[1])))
-        s_n.append((label, cost))
+    # Cell features used by the batched cost calculations
+    g.graph['l_cells'] = l_cells
+    g.graph['r_cells'] = r_cells
 
-    # sort by cost and only retain the fraction beta
-    s_n.sort(key=lambda tup: tup[1])
-    s_retain_index = int(round(beta * len(s_n)))
-    s_nodes = [s_n[i][0] for i in xrange(s_retain_index)]
-
-    # add nodes
-    g.add_nodes_from(s_nodes)
+    # --------
+    # Split nodes
+    s_pairs = retain_pairs(r_cells, beta, radius=radius, k=k)
+    g.graph['s_pairs'] = s_pairs
 
     # --------
     # Merge Nodes
-    m_n = []
-    merge_from = range(1, (len(l_nodes)+1))
-    for subset in combinations(merge_from, 2):
-        label = "M" + "(" + str(subset[0]) + "," + str(subset[1]) + ")"
-        cost = event_cost(g, ('L' + str(subset[0])), ('L' + str(subset[1])))
-        m_n.append((label, cost))
+    m_pairs = retain_pairs(l_cells, beta, radius=radius, k=k)
+    g.graph['m_pairs'] = m_pairs
 
-    # sort by cost and only retain the fraction beta
-    m_n.sort(key=lambda tup: tup[1])
-    m_retain_index = int(round(beta * len(m_n)))
-    m_nodes = [m_n[i][0] for i in xrange(m_retain_index)]
+    # --------
+    # Vertex table, integer IDs for every node in the graph
+    table = vertex_table(len(l_nodes), len(r_nodes), s_pairs, m_pairs)
+    g.graph['vertices'] = table
 
-    # add nodes
-    g.add_nodes_from(m_nodes)
+    # add split/merge nodes
+    g.add_nodes_from(table[table.start[S]:])
 
     return g
 
 
-def event_cost(g, node1, node2):
+def retain_pairs(cells, beta, radius=None, k=None):
+
+    # retain_pairs
+    # Pairs of cells from one frame that are candidates for a split/merge
+    # event. Candidate pairs are scored and only those with the lowest cost
+    # retained. The budget is the fraction beta of all possible pairs, so
+    # when it is met from the candidates the retained set is the same as if
+    # every pair had been scored.
+    #
+    # Inputs:   cells   -   dict of cell feature arrays
+    #           beta    -   pruning coefficient for split/merge events
+    #           radius  -   optional maximum distance between paired cells
+    #           k       -   optional number of nearest neighbours to pair with
+    #
+    # Outputs:  pairs   -   (p x 2) array of 0-based cell indices
+
+    n_cells = len(cells['area'])
+    pairs = candidate_pairs(cells['centroid'], radius=radius, k=k)
+
+    # only retain the fraction beta with lowest cost
+    cost = pair_costs(cells['centroid'], cells['area'], pairs)
+    retain_index = int(round(beta * (n_cells * (n_cells - 1) / 2)))
+    retain = lowest(cost[np.newaxis, :], retain_index)[0]
+
+    return pairs[retain]
+
+
+def candidate_pairs(centroids, radius=None, k=None):
+
+    # candidate_pairs
+    # Propose pairs of cells using a KD-tree over the cell centroids rather
+    # than enumerating all combinations.
+    #
+    # Inputs:   centroids   -   (n x 2) array of centroids
+    #           radius      -   optional maximum distance between the cells
+    #           k           -   optional number of nearest neighbours, at
+    #                           least 1
+    #
+    # Outputs:  pairs       -   (p x 2) array of 0-based cell indices (i < j)
+    #                           in the same order as itertools.combinations
+
+    if k is not None and k < 1:
+        raise ValueError('Number of nearest neighbours (pair_k) must be at '
+                         'least 1: ' + str(k))
+
+    n_cells = len(centroids)
+
+    # No restriction, all combinations
+    if (radius is None and k is None) or n_cells < 2:
+        i, j = np.triu_indices(n_cells, k=1)
+        return np.column_stack((i, j))
+
+    tree = cKDTree(centroids)
+
+    # All pairs within radius
+    if k is None:
+        pairs = np.array(sorted(tree.query_pairs(radius)),
+                         dtype=int).reshape(-1, 2)
+        return pairs
+
+    # k nearest neighbours (within radius, if given). One extra is queried
+    # as the cell itself is among them, though not necessarily first when
+    # centroids coincide.
+    upper_bound = np.inf if radius is None else radius
+    k = min(k, n_cells - 1)
+    dist, nn = tree.query(centroids, k=k+1, distance_upper_bound=upper_bound)
+    cell = np.arange(n_cells)[:, np.newaxis]
+
+    # Missing neighbours are reported with index n_cells, keep the first k
+    # of the others
+    found = (nn != cell) & (nn < n_cells)
+    found &= np.cumsum(found, axis=1) <= k
+    i = np.broadcast_to(cell, nn.shape)[found]
+    j = nn[found]
+    pairs = np.column_stack((np.minimum(i, j), np.maximum(i, j)))
+
+    # Unique pairs in combinations order
+    if len(pairs):
+        pair_id = np.unique(pairs[:, 0] * n_cells + pairs[:, 1])
+        pairs = np.column_stack((pair_id // n_cells, pair_id % n_cells))
+
+    return pairs.reshape(-1, 2)
+
+
+def cell_nodes(prefix, cells):
 
-    # event_cost
-    # cost of a pair of cells corresponding to split/merge event
+    # cell_nodes
+    # Node labels and attributes for the cells of one image frame
     #
-    # Inputs:   g       -   current graph structure
-    #           node1   -   label of node 1
-    #           node2   -   label of node 2
+    # Inputs:   prefix  -   label prefix, 'L' or 'R'
+    #           cells   -   dict of cell feature arrays
     #
-    # Outputs:  cost    -   cost metric
+    # Outputs:  c_nodes -   dict of node label: attribute dict
 
-    dist_cost = dist_calc(g.node, node1, node2)
-    area_sum = g.node[node1]['area'] + g.node[node2]['area']
+    centroids = [tuple(c) for c in cells['centroid'].tolist()]
+    areas = cells['area'].tolist()
+    bboxes = [tuple(b) for b in cells['bbox'].tolist()]
 
-    cost = dist_cost / area_sum
+    c_nodes = {}
+    for i in xrange(len(areas)):
+        c_nodes[prefix + str(i+1)] = {'centroid': centroids[i],
+                                      'area': areas[i],
+                                      'bbox': bboxes[i]}
 
-    return cost
+    return c_nodes
@@ -0,0 +1,46 @@
+# selection.py
+# Partial selection of the lowest cost entries, used for pruning
+
+# Import external packages
+import numpy as np
+
+__all__ = ['lowest']
+
+
+def lowest(costs, k):
+
+    # lowest
+    # Select the k lowest cost entries of each row of a cost matrix using a
+    # partial partition rather than a full sort. Ties at the cut-off are
+    # broken by column order, so the selection is the same as taking the
+    # first k entries of a stable sort.
+    #
+    # Inputs:   costs   - (rows x n) cost matrix
+    #           k       - number of entries to select from each row
+    #
+    # Outputs:  retain  - (rows x k) array of selected column indices, in
+    #                     increasing column order
+    #
+
+    rows, n = costs.shape
+    k = max(0, min(k, n))
+
+    # Trivial selections
+    if k == 0:
+        return np.zeros((rows, 0), dtype=int)
+    if k == n:
+        return np.tile(np.arange(n), (rows, 1))
+
+    # Cost of the k-th lowest entry in each row
+    kth = np.partition(costs, k-1, axis=1)[:, k-1:k]
+
+    # Everything strictly cheaper is retained, then ties with the k-th cost
+    # are taken in column order until each row has k entries
+    below = costs < kth
+    tied = costs == kth
+    need = k - below.sum(axis=1)[:, np.newaxis]
+    retain_tied = tied & (np.cumsum(tied, axis=1) <= need)
+
+    retain = np.nonzero(below | retain_tied)[1].reshape(rows, k)
+
+    return retain
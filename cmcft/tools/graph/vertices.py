@@ -0,0 +1,131 @@
+# vertices.py
+# Compact typed table of the vertices in the graph structure
+
+# Import external packages
+import numpy as np
+
+__all__ = ['L', 'R', 'A', 'D', 'S', 'M', 'VertexTable', 'vertex_table']
+
+# Vertex kinds
+L, R, A, D, S, M = range(6)
+
+
+class VertexTable(list):
+
+    # VertexTable
+    # List of vertex labels in vertex ID order, e.g. ['L1', 'L2', 'R1', 'A',
+    # 'D', 'S(1,2)'], carrying integer arrays that describe each vertex so
+    # that the graph pipeline can use integer indexing rather than string
+    # handling. Vertices are always ordered L, R, A, D, S, M so the cell
+    # vertices and the appear/disappear vertices form a prefix.
+    #
+    # Attributes:   kind    - (n) vertex kind, one of L, R, A, D, S, M
+    #               cell    - (n) 0-based cell index of L/R vertices, else -1
+    #               pair    - (n x 2) 0-based cell indices of S/M vertices,
+    #                         else -1
+    #               label_id - dict of label: vertex ID
+    #               pair_id - dict of (kind, a, b): vertex ID of S/M vertices
+    #               start   - dict of kind: ID of first vertex of that kind
+    #               stop    - dict of kind: ID after last vertex of that kind
+    #
+
+    def __init__(self, labels, kind, cell, pair):
+
+        list.__init__(self, labels)
+
+        self.kind = kind
+        self.cell = cell
+        self.pair = pair
+        self.label_id = dict((v, i) for i, v in enumerate(labels))
+
+        ms = np.flatnonzero(kind >= S)
+        self.pair_id = dict(((k, a, b), i) for k, (a, b), i in
+                            zip(kind[ms].tolist(), pair[ms].tolist(),
+                                ms.tolist()))
+
+        # Vertices of each kind are contiguous
+        self.start = {}
+        self.stop = {}
+        for k in (L, R, A, D, S, M):
+            ids = np.flatnonzero(kind == k)
+            self.start[k] = int(ids[0]) if len(ids) else len(labels)
+            self.stop[k] = int(ids[-1]) + 1 if len(ids) else len(labels)
+
+    def ids(self, k):
+
+        # ids
+        # Vertex IDs of one kind
+        #
+        # Inputs:   k   - vertex kind
+        # Outputs:  array of vertex IDs
+
+        return np.arange(self.start[k], self.stop[k])
+
+    def total(self, k):
+
+        # total
+        # Number of vertices of one kind
+
+        return self.stop[k] - self.start[k]
+
+    def coupled(self):
+
+        # coupled
+        # Table of the vertices that remain in the coupled matrix, the L, R,
+        # A and D vertices. Vertex IDs are unchanged.
+
+        n = self.stop[D]
+
+        return VertexTable(self[:n], self.kind[:n], self.cell[:n],
+                           self.pair[:n])
+
+
+def vertex_table(n_l, n_r, s_pairs, m_pairs):
+
+    # vertex_table
+    # Build the vertex table for a pair of frames.
+    #
+    # Inputs:   n_l     - number of cells in first image
+    #           n_r     - number of cells in second image
+    #           s_pairs - (p x 2) array of R cell indices of split vertices
+    #           m_pairs - (q x 2) array of L cell indices of merge vertices
+    #
+    # Outputs:  table   - VertexTable
+    #
+
+    n_s = len(s_pairs)
+    n_m = len(m_pairs)
+
+    labels = (['L' + str(i+1) for i in xrange(n_l)] +
+              ['R' + str(i+1) for i in xrange(n_r)] +
+              ['A', 'D'] +
+              pair_labels('S', s_pairs) +
+              pair_labels('M', m_pairs))
+
+    kind = np.concatenate((np.repeat(L, n_l), np.repeat(R, n_r), [A, D],
+                           np.repeat(S, n_s), np.repeat(M, n_m))).astype(int)
+
+    cell = np.concatenate((np.arange(n_l), np.arange(n_r),
+                           -np.ones(2 + n_s + n_m))).astype(int)
+
+    pair = np.vstack((-np.ones((n_l + n_r + 2, 2)),
+                      np.reshape(s_pairs, (-1, 2)),
+                      np.reshape(m_pairs, (-1, 2)))).astype(int)
+
+    return VertexTable(labels, kind, cell, pair)
+
+
+def pair_labels(prefix, pairs):
+
+    # pair_labels
+    # Node labels for split/merge events, e.g. 'S(3,7)'
+    #
+    # Inputs:   prefix  -   'S' or 'M'
+    #           pairs   -   (p x 2) array of 0-based cell indices
+    #
+    # Outputs:  labels  -   list of node labels
+
+    labels = [prefix + '(' + str(a+1) + ',' + str(b+1) + ')'
+              for a, b in np.reshape(pairs, (-1, 2)).tolist()]
+
+    return labels
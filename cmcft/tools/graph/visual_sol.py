@@ -1,38 +1,32 @@
 # graph_sol.py
 
 # import external packages
-import numpy as np
 import networkx as nx
 
+# Import functions
+from ..solve.decode import decode
 
-def graph_sol(a_matrix, vertices, x):
+
+def graph_sol(a_matrix, vertices, x, assoc=None):
 
     # graph_sol
     # Function to visualise the output from the optimisation
     #
     # Input:    a_matrix    -  coupled incidence matrix
-    #           vertices    - list giving the order of the vertices (rows) in
-    #                         the incidence matrix
-    #           x           - pyomo optimisation output
+    #           vertices    - order of the vertices (rows) in the incidence
+    #                         matrix (VertexTable)
+    #           x           - solution vector from solve.opto
+    #           assoc       - optional association table of the solution
+    #                         if already decoded, see solve.decode
     #
-    # Output:   g_sol       - graphical representation of the solution
+    # Output:   g_sol       - graphical representation of the solution, an
+    #                         edge from each predecessor to the successor of
+    #                         each association
     #
 
-    # -----
-    # Reduce the matrix to only included vertices and edges
-
-    # extract included edges as list
-    included_edges = list()
-    for col in xrange(len(x)):
-        included_edges.append(x[col].value)
-
-    # remove edges not included from incidence matrix
-    edges_to_remove = list()
-    for j in xrange(len(included_edges)):
-        if included_edges[j] == 0:
-            edges_to_remove.append(j)
-
-    a_reduced = np.delete(a_matrix, edges_to_remove, 1)
+    # Associations of the solution
+    if assoc is None:
+        assoc = decode(a_matrix, x, vertices)
 
     # -----
     # construct graph of solution
@@ -42,20 +36,9 @@ def graph_sol(a_matrix, vertices, x):
     g.add_nodes_from(vertices)
 
     # add edges
-    for col in xrange(a_reduced.shape[1]):
-        start_nodes = list()
-        finish_nodes = list()
-
-        edge = (a_reduced[:, col])
-        node_i = np.nonzero(edge)
-
-        for node in node_i[0]:
-            if edge[node] < 0:
-                start_nodes.append(node)
-            else:
-                finish_nodes.append(node)
-
-        for x in xrange(len(start_nodes)):
-            g.add_edge(vertices[start_nodes[x]], vertices[finish_nodes[x]])
+    for pred, succ in zip(assoc['pred'].tolist(), assoc['succ'].tolist()):
+        for i in pred:
+            if i >= 0:
+                g.add_edge(vertices[i], vertices[succ])
 
     return g
@@ -1,5 +1,11 @@
 from .output import update
 from .visualise import overlay
 from .output import initialise_out
+from .output import finish_tracks
+from .output import associations
 from .save import save_csv
 from .save import save_json
+from .store import TrackStore
+from .writers import open_writer
+from .writers import available_formats
+from .writers import load_npz
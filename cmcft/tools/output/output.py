@@ -1,10 +1,14 @@
 # output
 # functions to manage the output of optimiser
 
-import collections
+import numpy as np
 
+# Import functions
+from ..solve.decode import decode, EVENTS, MOVE, APPEAR, SPLIT, MERGE
+from .store import TrackStore
 
-def update(g, a_matrix, x, out, c_vertices):
+
+def update(g, a_matrix, x, out, c_vertices, assoc=None):
 
     # update_out
     # Given optimisation solution update the output data structure
@@ -14,163 +18,123 @@ def update(g, a_matrix, x, out, c_vertices):
     #           x           -   solution from optimisation
     #           out         -   current output data structure
     #           c_vertices  -   order of vertices in coupled matrix
+    #                           (VertexTable)
+    #           assoc       -   optional association table of the solution
+    #                           if already decoded, see solve.decode
     #
     # Outputs:  update_out  -   updated output data
     #
 
-    # Reduce incidence matrix to sol list of lists
-    a_sol = reduce_a(a_matrix, x)
+    # Associations of the solution
+    if assoc is None:
+        assoc = decode(a_matrix, x, c_vertices)
 
-    # Check if first output, else associate L cells with tracks
+    # Check if first output
     if not out:
-        out = initialise_out(g.node)
-
-    # Create dict of 'active cells' and their l_labels in previous frame
-    active_cells = label_active(g.node, out)
-
-    # Update frame number
-    out['frame'] += 1
-
-    # Update connections
-    for row, vertex in enumerate(c_vertices):
-
-        # Find new cells and the edge going TO that cell
-        if 'R' in vertex:
-
-            edge = a_sol[row].index(1)
-
-            # Find labels for predecessors
-            predecessors = [c_vertices[i] for i, v in enumerate(a_sol) if v[edge] == -1]
+        out = initialise_out(g)
 
-            # Simple cell movement
-            if len(predecessors) == 1:
-                prev = predecessors.pop()
+    store = out['tracks']
+    cells = g.graph['r_cells']
 
-                # Cell moved
-                if 'L' in prev:
-                    update_cell_data(out, vertex, prev, g.node, active_cells)
+    # Track of each L cell, carried from the previous frame
+    active = out['active']
 
-                # Cell appeared
-                elif 'A' in prev:
-                    update_appear(out, vertex, g.node)
+    # Track of each R cell
+    r_active = {}
 
-            # Cell from split/merge
-            elif len(predecessors) > 1:
-                update_split_merge(out, vertex, g.node, predecessors, active_cells)
+    # Cell index of each vertex
+    cell = c_vertices.cell.tolist()
 
-    return out
-
-
-def update_cell_data(out, vertex, prev, g_nodes, active_cells):
-
-    # update_cell_data
-    # Update output with cell data
-    #
-    # inputs:   out             - current output data
-    #           vertex          - label for new cell data
-    #           prev            - label for prev cell data
-    #           g_nodes         - nodes in graph with attributes
-    #           active_cells    - dict of 'active' cells and prev labels
+    # Update frame number
+    out['frame'] += 1
 
-    # find output row
-    for cell_id, l_label in active_cells.iteritems():
-        if l_label == prev:
+    # Update connections, associations are in R vertex order
+    for pred, succ, event in zip(assoc['pred'].tolist(),
+                                 assoc['succ'].tolist(),
+                                 assoc['event'].tolist()):
 
-            # Update cell information
-            features = out['tracks'][cell_id]
-            for key, value in features.iteritems():
+        cell_id = None
 
-                # Append frame number
-                if key == 'frame':
-                    features['frame'].append((features['frame'][-1] + 1))
+        # Cell moved
+        if event == MOVE:
+            cell_id = active.get(cell[pred[0]])
 
-                # append cell feature data
-                elif isinstance(features[key], list):
-                    features[key].append(g_nodes[vertex][key])
+        # Cell appeared
+        elif event == APPEAR:
+            cell_id = store.new_track()
 
+        # Cell from split/merge, record the parent cell IDs
+        elif event in (SPLIT, MERGE):
+            parent_ids = [active[cell[i]] for i in pred
+                          if i >= 0 and cell[i] in active]
+            cell_id = store.new_track(parent=tuple(parent_ids))
 
-def update_appear(current_out, vertex, g_nodes):
+        if cell_id is not None:
+            r_active[cell[succ]] = cell_id
 
-    # update_appear
-    # Update output for cell appearances
-    #
-    # Inputs:   current_out     - current output data (list of lists)
-    #           vertex          - label for new cell data (string)
-    #           g_nodes         - nodes in graph with associated attributes
-    #           parent_id       - parent cell labels (if any)
-    #
+    # Add cell data of this frame to the tracks
+    r_cells = list(r_active)
+    store.extend([r_active[i] for i in r_cells], out['frame'], cells,
+                 r_cells)
 
-    # Initialise data structure for new track
-    new_cell_track = initialise_track(g_nodes[vertex])
-    cell_id = len(current_out['tracks'])
-    new_cell_track['cell_id'] = cell_id
+    # Tracks not continued into this frame have ended
+    out['ended'] = sorted(set(active.values()) - set(r_active.values()))
 
-    # Adjust frame to moment appeared
-    new_cell_track['frame'] = [current_out['frame']]
+    # R cells are the L cells of the next frame
+    out['active'] = next_active(r_active)
 
-    # Add to output
-    current_out['tracks'][cell_id] = new_cell_track
+    return out
 
 
-def update_split_merge(current_out, vertex, g_nodes, predecessors, active_cells):
+def finish_tracks(out, end=False, keep=False):
 
-    # update_split_merge
-    # Update output data structure for split/merge event
+    # finish_tracks
+    # Find the tracks that have terminated and remove them from the output,
+    # so only the tracks of cells in the current frame are held. A track
+    # terminates when its cell is not continued into the current frame,
+    # i.e. it disappeared, split or merged.
     #
-    # inputs:   current_out     - current output data (list of lists)
-    #           vertex          - label for new cell data (string)
-    #           g_nodes         - nodes in graph structure with attributes
-    #           predecessors    - list of parent cell labels
+    # Inputs:   out         - current output data, updated in place
+    #           end         - sequence has ended, all tracks terminate
+    #           keep        - keep finished tracks in the output
     #
-    # outputs   updated_out - updated output structure
+    # Outputs:  finished    - TrackStore of the tracks terminating in this
+    #                         frame
     #
 
-    # Add new cell track to output
-    update_appear(current_out, vertex, g_nodes)
-
-    # cell_id of new cell
-    new_id = len(current_out['tracks']) - 1
-
-    # Record the parent cell_IDs
-    parent_ids = []
+    if end:
+        ended = sorted(out['active'].values())
+    else:
+        ended = out.get('ended', [])
 
-    # find the cell ID of the parent cell
-    for parent in predecessors:
-        if 'L' in parent:
-            for cell_id, l_label in active_cells.iteritems():
-                if l_label == parent:
-                    parent_ids.append(cell_id)
+    if keep:
+        return out['tracks'].select(ended)
 
-    # store as parents
-    current_out['tracks'][new_id]['parent'] = tuple(parent_ids)
+    return out['tracks'].pop(ended)
 
 
-def reduce_a(a, x):
+def associations(assoc, c_vertices):
 
-    # reduce_a
-    # Reduces incidence matrix to only included vertices and edges
+    # associations
+    # Association table as vertex labels, e.g. (('L1',), 'R3', 'move') for a
+    # cell moving or (('L2', 'L5'), 'R4', 'merge') for a merge.
     #
-    # Inputs:   a   - dense coupled incidence matrix
-    #           x   - Optimisation solution
+    # Inputs:   assoc       - association table, see solve.decode
+    #           c_vertices  - order of vertices in coupled matrix
     #
-    # Outputs:  a_sol - incidence matrix with only included edges/vertices
-    #                   list of lists
+    # Outputs:  labelled    - list of (predecessors, successor, event)
     #
 
-    # Extract edges to delete from solution
-    included_edges = [j for j in xrange(len(x)) if x[j].value == 1]
-
-    if not included_edges:
-        raise ValueError('Optimiser did not find a solution')
-
-    # Remove edges not included from incidence matrix
-    a_reduced = a[:, included_edges]
-    a_sol = a_reduced.tolist()
+    labelled = [(tuple(c_vertices[i] for i in pred if i >= 0),
+                 c_vertices[succ], EVENTS[event])
+                for pred, succ, event in zip(assoc['pred'].tolist(),
+                                             assoc['succ'].tolist(),
+                                             assoc['event'].tolist())]
 
-    return a_sol
+    return labelled
 
 
-def initialise_out(g_nodes):
+def initialise_out(g):
 
     # initialise_out
     # Function to initialise_out output format
@@ -183,55 +147,33 @@ def initialise_out(g_nodes):
     out = dict()
     out['frame'] = 0
 
-    tracks = collections.OrderedDict()
+    # A track for each L cell
+    cells = g.graph['l_cells']
+    n_cells = len(cells['area'])
 
-    for vertex, data in g_nodes.iteritems():
-        if 'L' in vertex:
-
-            # initialise_out cell data
-            track = initialise_track(data)
-            cell_id = len(tracks)
-            track['cell_id'] = cell_id
-            tracks[cell_id] = track
+    tracks = TrackStore()
+    cell_ids = [tracks.new_track() for _ in xrange(n_cells)]
+    tracks.extend(cell_ids, 0, cells, np.arange(n_cells))
 
     out['tracks'] = tracks
 
+    # Track of each L cell, by cell index
+    out['active'] = dict(enumerate(cell_ids))
+
     return out
 
 
-def label_active(g_nodes, out):
+def next_active(r_active):
 
-    # label_active
-    # Data structure for cells that are 'active' in the tracking.
-    # Holds what the cell's L label is in the previous image.
+    # next_active
+    # The cells of the second image of one pair are the cells of the first
+    # image of the next, so R cell indices are the next pair's L cell
+    # indices.
     #
-    # Inputs:   g_nodes     - nodes in graph
-    #           out         - current out data
+    # Inputs:   r_active    - dict of R cell index: cell ID
+    #
+    # Outputs:  active      - dict of L cell index: cell ID for the next
+    #                         frame
     #
 
-    active_cells = dict()
-
-    # For each L node
-    for vertex in g_nodes:
-        if 'L' in vertex:
-
-            # find track associated and label with cell name
-            for cell_id, data in out['tracks'].iteritems():
-                if data['centroid'][-1] == g_nodes[vertex]['centroid']:
-                    active_cells[cell_id] = vertex
-
-    return active_cells
-
-
-def initialise_track(data):
-
-    # initialise_track
-    # initialise track for new cell in output
-
-    track = {'frame': [0],
-             'parent': None}
-
-    for key, value in data.iteritems():
-        track[key] = [value]
-
-    return track
+    return dict(r_active)
@@ -1,25 +1,26 @@
 # save.py
 # Offer functions for saving the tracking output
 
-import csv
 import json
 
+# Import functions
+from .writers import open_writer
+
 
 def save_csv(output_data, save_path):
 
     # save_csv
-    # save tracking output to csv file
+    # save tracking output to csv files, a table of observations
+    # (output_data.csv) and a table of parent links
+    # (output_data_parents.csv)
     #
-    # Inputs:   output_data - output data structure (list of lists)
+    # Inputs:   output_data - output data structure
     #           save_path   - dir to save csv inside
     #
 
-    # Set save path
-    save_out = save_path + '/output_data.csv'
-
-    with open(save_out, 'wb') as f:
-        writer = csv.writer(f)
-        writer.writerows(output_data)
+    writer = open_writer(save_path, 'csv')
+    writer.write(output_data['tracks'])
+    writer.close()
 
 
 def save_json(output_data, save_path):
@@ -27,8 +28,8 @@ def save_json(output_data, save_path):
     # save_json
     # save tracking output to json file
     #
-    # Inputs:   output_data - output data structure (list of lists)
-    #           save_path   - dir to save csv inside
+    # Inputs:   output_data - output data structure
+    #           save_path   - dir to save json inside
     #
 
     # Set save path
@@ -36,5 +37,5 @@ def save_json(output_data, save_path):
 
     # Write file
     with open(save_out, 'wb') as outfile:
-        json.dump(output_data['tracks'],
+        json.dump(output_data['tracks'].as_dict(),
                   outfile)
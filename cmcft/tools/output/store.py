@@ -0,0 +1,276 @@
+# store.py
+# Columnar store of cell tracks
+
+# Import external packages
+import collections
+import numpy as np
+
+__all__ = ['TrackStore', 'OBS_COLUMNS', 'CELL_COLUMNS']
+
+# Observation columns: name, type and shape of one value
+OBS_COLUMNS = (('track_id', int, ()),
+               ('frame', int, ()),
+               ('centroid', float, (2,)),
+               ('area', int, ()),
+               ('bbox', int, (4,)))
+
+# Observation columns taken from the cell feature arrays of a frame
+CELL_COLUMNS = ('centroid', 'area', 'bbox')
+
+
+class TrackStore(object):
+
+    # TrackStore
+    # Cell tracks held as a flat table of observations, one row per cell per
+    # frame, in typed NumPy buffers that grow by doubling. Each track has an
+    # entry in a parent table, giving the IDs of the tracks it split or
+    # merged from (None if it started in the first frame or appeared).
+    #
+    # Each track keeps the list of its rows, so selecting or removing
+    # tracks touches only their own rows rather than the whole table. Rows
+    # of removed tracks are left in place and the buffers compacted once
+    # they make up half of the table, or before the table is read.
+    #
+    # The old dict of per-track lists is available through as_dict, e.g.
+    # {0: {'cell_id': 0, 'parent': None, 'frame': [0, 1],
+    #      'centroid': [(y, x), (y, x)], 'area': [..], 'bbox': [..]}}
+    #
+    # Attributes:   n_obs       - number of observations held
+    #               n_tracks    - number of track IDs issued, the next
+    #                             track ID
+    #               parents     - OrderedDict of track_id: tuple of parent
+    #                             track IDs or None, for the tracks held
+    #               last_frame  - dict of track_id: last frame observed
+    #
+
+    def __init__(self, capacity=1024):
+
+        self._obs = dict((name, np.empty((capacity,) + shape, dtype=dtype))
+                         for name, dtype, shape in OBS_COLUMNS)
+        self.n_obs = 0
+        self.n_tracks = 0
+        self.parents = collections.OrderedDict()
+        self.last_frame = {}
+        self._rows = {}
+        self._n_rows = 0
+
+    def __len__(self):
+
+        return len(self.parents)
+
+    def __contains__(self, track_id):
+
+        return track_id in self.parents
+
+    def __iter__(self):
+
+        return iter(self.parents)
+
+    def new_track(self, parent=None):
+
+        # new_track
+        # Start a new track, observations are added with extend
+        #
+        # Inputs:   parent      - tuple of parent track IDs, or None
+        # Outputs:  track_id    - ID of the new track
+        #
+
+        track_id = self.n_tracks
+        self.n_tracks += 1
+        self.parents[track_id] = parent
+        self._rows[track_id] = []
+
+        return track_id
+
+    def extend(self, track_ids, frame, cells, index):
+
+        # extend
+        # Add one observation to each of a set of tracks
+        #
+        # Inputs:   track_ids   - track ID of each observation
+        #           frame       - frame number of the observations
+        #           cells       - dict of cell feature arrays of the frame
+        #           index       - cell index of each observation in cells
+        #
+
+        n = len(track_ids)
+        self.reserve(self._n_rows + n)
+
+        rows = slice(self._n_rows, self._n_rows + n)
+        self._obs['track_id'][rows] = track_ids
+        self._obs['frame'][rows] = frame
+        for name in CELL_COLUMNS:
+            self._obs[name][rows] = cells[name][index]
+
+        for row, track_id in enumerate(track_ids, self._n_rows):
+            self._rows[track_id].append(row)
+            self.last_frame[track_id] = frame
+
+        self._n_rows += n
+        self.n_obs += n
+
+    def reserve(self, capacity):
+
+        # reserve
+        # Grow the observation buffers to hold at least capacity rows
+
+        size = len(self._obs['frame'])
+        if capacity <= size:
+            return
+
+        while size < capacity:
+            size *= 2
+
+        for name in self._obs:
+            column = self._obs[name]
+            grown = np.empty((size,) + column.shape[1:], dtype=column.dtype)
+            grown[:self._n_rows] = column[:self._n_rows]
+            self._obs[name] = grown
+
+    def columns(self):
+
+        # columns
+        # Observation table, dict of column name: array (views of the
+        # buffers, in order of addition)
+
+        self.compact()
+
+        return dict((name, column[:self.n_obs])
+                    for name, column in self._obs.iteritems())
+
+    def parent_links(self):
+
+        # parent_links
+        # Parent table as links, one per parent of each track
+        #
+        # Outputs:  child   - array of track IDs
+        #           parent  - array of parent track IDs
+        #
+
+        links = [(track_id, parent)
+                 for track_id, parents in self.parents.iteritems()
+                 if parents for parent in parents]
+        links = np.array(links, dtype=int).reshape(-1, 2)
+
+        return links[:, 0], links[:, 1]
+
+    def select(self, track_ids):
+
+        # select
+        # Copy of a subset of the tracks
+        #
+        # Inputs:   track_ids   - IDs of tracks to copy
+        # Outputs:  subset      - TrackStore of those tracks
+        #
+
+        track_ids = sorted(t for t in track_ids if t in self.parents)
+        rows = np.sort(np.array([row for t in track_ids
+                                 for row in self._rows[t]], dtype=int))
+
+        subset = TrackStore(capacity=max(len(rows), 1))
+        for name, column in self._obs.iteritems():
+            subset._obs[name][:len(rows)] = column[rows]
+        subset.n_obs = subset._n_rows = len(rows)
+        subset.n_tracks = self.n_tracks
+        for track_id in track_ids:
+            subset.parents[track_id] = self.parents[track_id]
+            subset.last_frame[track_id] = self.last_frame.get(track_id)
+        subset._rows = subset.track_rows()
+
+        return subset
+
+    def pop(self, track_ids):
+
+        # pop
+        # Remove a subset of the tracks
+        #
+        # Inputs:   track_ids   - IDs of tracks to remove
+        # Outputs:  subset      - TrackStore of the removed tracks
+        #
+
+        subset = self.select(track_ids)
+
+        # Rows are dropped from the buffers when compacted
+        for track_id in subset.parents:
+            del self.parents[track_id]
+            self.last_frame.pop(track_id, None)
+            del self._rows[track_id]
+        self.n_obs -= subset.n_obs
+
+        if 2 * self.n_obs < self._n_rows:
+            self.compact()
+
+        return subset
+
+    def compact(self):
+
+        # compact
+        # Drop the rows of removed tracks from the buffers
+
+        if self.n_obs == self._n_rows:
+            return
+
+        keep = np.sort(np.array([row for rows in self._rows.itervalues()
+                                 for row in rows], dtype=int))
+        for name, column in self._obs.iteritems():
+            column[:len(keep)] = column[keep]
+        self._n_rows = len(keep)
+        self._rows = self.track_rows()
+
+    def track_rows(self):
+
+        # track_rows
+        # Rows of each track held, from the track_id column
+        #
+        # Outputs:  rows    - dict of track_id: list of rows, in order
+        #
+
+        rows = dict((track_id, []) for track_id in self.parents)
+        for row, track_id in enumerate(
+                self._obs['track_id'][:self._n_rows].tolist()):
+            rows[track_id].append(row)
+
+        return rows
+
+    def as_dict(self):
+
+        # as_dict
+        # Dict view of the tracks, the output format of earlier versions
+        #
+        # Outputs:  tracks  - OrderedDict of track_id: dict of track data,
+        #                     in track ID order
+        #
+
+        obs = self.columns()
+
+        # Rows of each track, in frame order
+        order = np.lexsort((obs['frame'], obs['track_id']))
+        track_ids, starts = np.unique(obs['track_id'][order],
+                                      return_index=True)
+        bounds = dict(zip(track_ids.tolist(),
+                          zip(starts.tolist(),
+                              np.append(starts[1:], len(order)).tolist())))
+
+        frame = obs['frame'][order].tolist()
+        centroid = [tuple(c) for c in obs['centroid'][order].tolist()]
+        area = obs['area'][order].tolist()
+        bbox = [tuple(b) for b in obs['bbox'][order].tolist()]
+
+        tracks = collections.OrderedDict()
+        for track_id, parent in self.parents.iteritems():
+            a, b = bounds.get(track_id, (0, 0))
+            tracks[track_id] = {'cell_id': track_id,
+                                'parent': parent,
+                                'frame': frame[a:b],
+                                'centroid': centroid[a:b],
+                                'area': area[a:b],
+                                'bbox': bbox[a:b]}
+
+        return tracks
+
+    def iteritems(self):
+
+        # iteritems
+        # (track_id, dict of track data) for each track, as as_dict
+
+        return self.as_dict().iteritems()
@@ -0,0 +1,295 @@
+# writers.py
+# Writers that save tracks in tabular form, chunk by chunk, so output can be
+# written while tracking is still running. Each chunk is a TrackStore, e.g.
+# the tracks that terminated in one frame.
+#
+# Observations are written as the columns of TABLE_COLUMNS and parent links
+# as (track_id, parent_id) rows.
+
+# Import external packages
+import collections
+import csv
+import io
+import zipfile
+import numpy as np
+
+__all__ = ['TABLE_COLUMNS', 'PARENT_COLUMNS', 'table_columns',
+           'CsvWriter', 'NpzWriter', 'Hdf5Writer', 'ParquetWriter',
+           'WRITERS', 'EXTENSIONS', 'available_formats', 'open_writer',
+           'load_npz']
+
+# Flat observation columns
+TABLE_COLUMNS = ('track_id', 'frame', 'centroid_y', 'centroid_x', 'area',
+                 'bbox_min_row', 'bbox_min_col', 'bbox_max_row',
+                 'bbox_max_col')
+
+# Parent link columns
+PARENT_COLUMNS = ('track_id', 'parent_id')
+
+
+def table_columns(tracks):
+
+    # table_columns
+    # Flat observation and parent link columns of a set of tracks
+    #
+    # Inputs:   tracks      - TrackStore
+    #
+    # Outputs:  obs         - OrderedDict of TABLE_COLUMNS: 1-D array
+    #           parents     - OrderedDict of PARENT_COLUMNS: 1-D array
+    #
+
+    columns = tracks.columns()
+    centroid = columns['centroid']
+    bbox = columns['bbox']
+
+    obs = collections.OrderedDict(zip(TABLE_COLUMNS,
+                                      (columns['track_id'],
+                                       columns['frame'],
+                                       centroid[:, 0], centroid[:, 1],
+                                       columns['area'],
+                                       bbox[:, 0], bbox[:, 1],
+                                       bbox[:, 2], bbox[:, 3])))
+
+    parents = collections.OrderedDict(zip(PARENT_COLUMNS,
+                                          tracks.parent_links()))
+
+    return obs, parents
+
+
+class CsvWriter(object):
+
+    # CsvWriter
+    # Streaming CSV writer, one file of observations (path) and one of
+    # parent links (path with '_parents' before the extension), each with
+    # a header row.
+
+    def __init__(self, path):
+
+        self.path = path
+        self.parents_path = parents_path(path)
+
+        self._files = [open(self.path, 'wb'), open(self.parents_path, 'wb')]
+        self._obs = csv.writer(self._files[0])
+        self._parents = csv.writer(self._files[1])
+
+        self._obs.writerow(TABLE_COLUMNS)
+        self._parents.writerow(PARENT_COLUMNS)
+
+    def write(self, tracks):
+
+        obs, parents = table_columns(tracks)
+
+        self._obs.writerows(zip(*[c.tolist() for c in obs.values()]))
+        self._parents.writerows(zip(*[c.tolist() for c in parents.values()]))
+
+    def close(self):
+
+        for f in self._files:
+            f.close()
+
+
+class NpzWriter(object):
+
+    # NpzWriter
+    # NumPy .npz writer needing no extra dependencies. Each chunk is added
+    # to the zip archive as arrays named '<column>_<chunk>', for observation
+    # columns, and 'parents_<column>_<chunk>'. load_npz joins the chunks.
+
+    def __init__(self, path):
+
+        self.path = path
+        self.n_chunks = 0
+        self._zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED,
+                                    allowZip64=True)
+
+    def write(self, tracks):
+
+        obs, parents = table_columns(tracks)
+
+        arrays = [(name, column) for name, column in obs.iteritems()]
+        arrays += [('parents_' + name, column)
+                   for name, column in parents.iteritems()]
+
+        for name, column in arrays:
+            buf = io.BytesIO()
+            np.lib.format.write_array(buf, np.ascontiguousarray(column))
+            self._zip.writestr('%s_%05d.npy' % (name, self.n_chunks),
+                               buf.getvalue())
+
+        self.n_chunks += 1
+
+    def close(self):
+
+        self._zip.close()
+
+
+class Hdf5Writer(object):
+
+    # Hdf5Writer
+    # HDF5 writer (h5py), observation columns in group 'observations' and
+    # parent links in group 'parents', as resizable chunked datasets that
+    # each chunk of tracks is appended to.
+
+    def __init__(self, path):
+
+        import h5py
+
+        self.path = path
+        self._file = h5py.File(path, 'w')
+
+    def write(self, tracks):
+
+        obs, parents = table_columns(tracks)
+
+        for group, columns in (('observations', obs), ('parents', parents)):
+            for name, column in columns.iteritems():
+                key = group + '/' + name
+                if key not in self._file:
+                    self._file.create_dataset(key, shape=(0,),
+                                              maxshape=(None,),
+                                              dtype=column.dtype,
+                                              chunks=(65536,),
+                                              compression='gzip')
+                dataset = self._file[key]
+                n = dataset.shape[0]
+                dataset.resize((n + len(column),))
+                dataset[n:] = column
+
+    def close(self):
+
+        self._file.close()
+
+
+class ParquetWriter(object):
+
+    # ParquetWriter
+    # Parquet writer (pyarrow), one file of observations (path) and one of
+    # parent links (path with '_parents' before the extension). Each chunk
+    # of tracks is written as a row group.
+
+    def __init__(self, path):
+
+        import pyarrow
+        import pyarrow.parquet
+
+        self.path = path
+        self.parents_path = parents_path(path)
+        self._pa = pyarrow
+        self._writers = {}
+
+    def write(self, tracks):
+
+        obs, parents = table_columns(tracks)
+
+        for path, columns in ((self.path, obs), (self.parents_path, parents)):
+            table = self._pa.Table.from_arrays(
+                [self._pa.array(c) for c in columns.values()],
+                list(columns.keys()))
+
+            if path not in self._writers:
+                self._writers[path] = self._pa.parquet.ParquetWriter(
+                    path, table.schema)
+            self._writers[path].write_table(table)
+
+    def close(self):
+
+        for writer in self._writers.values():
+            writer.close()
+
+
+# Binary writers in order of preference, with their file extensions
+WRITERS = collections.OrderedDict([('hdf5', Hdf5Writer),
+                                   ('parquet', ParquetWriter),
+                                   ('npz', NpzWriter)])
+
+EXTENSIONS = {'hdf5': '.h5', 'parquet': '.parquet', 'npz': '.npz',
+              'csv': '.csv'}
+
+
+def available_formats():
+
+    # available_formats
+    # Binary formats whose dependencies can be imported, in order of
+    # preference
+    #
+    # Outputs:  names   - list of format names
+
+    names = []
+
+    try:
+        import h5py
+        names.append('hdf5')
+    except ImportError:
+        pass
+
+    try:
+        import pyarrow.parquet
+        names.append('parquet')
+    except ImportError:
+        pass
+
+    names.append('npz')
+
+    return names
+
+
+def open_writer(save_path, fmt, name='output_data'):
+
+    # open_writer
+    # Open a writer in a directory
+    #
+    # Inputs:   save_path   - directory to save in
+    #           fmt         - 'csv', one of WRITERS or 'auto' for the first
+    #                         available binary format
+    #           name        - file name without extension
+    #
+    # Outputs:  writer      - writer object with write(tracks) and close()
+    #
+
+    if fmt == 'auto':
+        fmt = available_formats()[0]
+
+    if fmt == 'csv':
+        writer = CsvWriter
+    elif fmt in WRITERS:
+        writer = WRITERS[fmt]
+    else:
+        raise ValueError('Unknown output format: ' + str(fmt))
+
+    return writer(save_path + '/' + name + EXTENSIONS[fmt])
+
+
+def load_npz(path):
+
+    # load_npz
+    # Read tracks written by NpzWriter
+    #
+    # Inputs:   path        - path of .npz file
+    #
+    # Outputs:  obs         - OrderedDict of TABLE_COLUMNS: 1-D array
+    #           parents     - OrderedDict of PARENT_COLUMNS: 1-D array
+    #
+
+    data = np.load(path)
+    keys = sorted(data.keys(), key=lambda k: int(k.rsplit('_', 1)[1]))
+
+    def join(name):
+        chunks = [data[k] for k in keys if k.rsplit('_', 1)[0] == name]
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=int)
+
+    obs = collections.OrderedDict((c, join(c)) for c in TABLE_COLUMNS)
+    parents = collections.OrderedDict((c, join('parents_' + c))
+                                      for c in PARENT_COLUMNS)
+    data.close()
+
+    return obs, parents
+
+
+def parents_path(path):
+
+    # parents_path
+    # Path of the parent link file that goes with an observation file
+
+    stem, dot, ext = path.rpartition('.')
+
+    return stem + '_parents' + dot + ext if dot else path + '_parents'
@@ -1,3 +1,4 @@
 from .a_matrix import a_matrix
 from .b_flow import b_flow
-from .c_cost import c_cost
\ No newline at end of file
+from .c_cost import c_cost
+from .x_bound import x_bound
@@ -3,14 +3,14 @@
 #
 
 # Import external packages
-import networkx as nx
 import numpy as np
+import scipy.sparse as sp
+
+# Import functions
+from ..graph.vertices import L, R, A, D, S, M
 
 __all__ = ["a_matrix",
-           "build_coupled_edges",
-           "couple_node_sets",
-           "reduce_to_coupled",
-           "adjust_capacity_edges"]
+           "build_coupled_edges"]
 
 
 def a_matrix(g):
@@ -18,176 +18,136 @@ def a_matrix(g):
     # couple_matrix
     # Construct coupled graph matrix from graph structure
     #
+    # The coupled matrix is assembled directly in sparse form from the
+    # graph's vertex table and edge arrays. Simple edges between L, R, A and
+    # D vertices are one column each (-1 at the source, +1 at the target).
+    # Each split/merge vertex is replaced by coupled columns joining its
+    # neighbours, so split/merge vertices and their edges never enter the
+    # matrix. The A->D edge is a single column, its higher capacity is given
+    # by params.x_bound.
     #
     # Inputs:   g           -   current graph structure
     #
-    # Outputs:  a_coup      -   coupled incidence matrix
+    # Outputs:  a_coup      -   coupled incidence matrix (scipy.sparse CSC)
     #           a_vertices  -   order of vertices in coupled matrix
+    #                           (VertexTable, row i is vertex ID i)
+    #           a_edges     -   (columns x 4) IDs of the graph edges each
+    #                           column is made from, -1 for padding (for
+    #                           params.c_cost)
     #
 
-    # order of vertices in incidence matrix
-    nodelist = g.nodes()
-    a_vertices = [n for n in nodelist if 'M' not in n and 'S' not in n]
-
-    # Incidence matrix
-    a_sparse = nx.incidence_matrix(g, nodelist=nodelist, oriented=True)
-    a_dense = a_sparse.todense()
-
-    # Build new coupled edges
-    edges_to_add = build_coupled_edges(g, nodelist)
-
-    # Add edges to matrix
-    try:
-        a_extra = np.hstack((a_dense, edges_to_add))
-    except ValueError:
-        print('No edges to couple in this frame')
-        a_extra = a_dense
-
-    # Remove split/merge vertices and previously associated edges
-    a_reduce = reduce_to_coupled(a_extra, nodelist)
-
-    # Adjust for higher capacity edges
-    a_cap = adjust_capacity_edges(a_reduce, nodelist)
-
-    a_coup = a_cap.copy()
-    return a_coup, a_vertices
-
-
-def build_coupled_edges(g, nodelist):
-
-    # new_coupled_edges
-    # given a graph structure returns list of new coupled edges.
-    #
-    # Inputs:   g           - graph structure
-    #           nodelist    - order of rows in incidence matrix
-    #
-    # Outputs:  new_edges   - list of edges to add
-
-    # Initialise list of new edges
-    new_edges = []
-
-    # Loop through nodes
-    for node in nodelist:
-        if 'M' in node or 'S' in node:
-
-            # sets of neighbouring nodes is split/merge is in solution
-            fixed_set, cycle_set = couple_node_sets(g, node)
-
-            fixed_edge = [0] * len(nodelist)
-            for f in fixed_set:
-                fixed_edge[nodelist.index(f[0])] = f[1]
-
-            for c in cycle_set:
-                coupled_edge = list(fixed_edge)
-                coupled_edge[nodelist.index(c[0])] = c[1]
-
-                new_edges.append(coupled_edge)
-
-    new_array = np.asarray(new_edges)
-    new_array = np.transpose(new_array)
-
-    return new_array
+    table = g.graph['vertices']
+    source = g.graph['edges']['source']
+    target = g.graph['edges']['target']
 
+    # order of vertices in incidence matrix, L, R, A and D vertices form a
+    # prefix of the vertex table so rows are vertex IDs
+    a_vertices = table.coupled()
+    n_rows = len(a_vertices)
 
-def couple_node_sets(g, node):
+    # Simple edges, those not connected to split/merge vertices
+    simple = (source < n_rows) & (target < n_rows)
+    n_simple = int(simple.sum())
 
-    # couple_sets
-    # Find the sets of coupling neighbour nodes.
-    #
-    # Inputs:   g       - graph structure
-    #           node    - node in question
-    #
-    # Outputs:  fixed_set - invariant neighbours when node is in solution
-    #           cycle_set - varying neighbours when node is in solution
+    rows = [source[simple], target[simple]]
+    cols = [np.arange(n_simple), np.arange(n_simple)]
+    vals = [-np.ones(n_simple, dtype=int), np.ones(n_simple, dtype=int)]
 
-    s = [(n, 1) for n in g.successors(node)]
-    p = [(n, -1) for n in g.predecessors(node)]
+    # Each column carries the IDs of the graph edges it is made from, -1
+    # pads columns built from fewer edges
+    col_edges = [np.column_stack((np.flatnonzero(simple),
+                                  -np.ones((n_simple, 3), dtype=int)))]
 
-    cycle_set = None
-    fixed_set = None
+    # Build new coupled edges
+    c_rows, c_cols, c_vals, c_edges = build_coupled_edges(table, source,
+                                                          target)
 
-    if 'M' in node:
-        s.remove(('D', 1))
-        p.append(('D', 1))
+    rows.append(c_rows)
+    cols.append(c_cols + n_simple)
+    vals.append(c_vals)
+    col_edges.append(c_edges)
 
-        cycle_set = s
-        fixed_set = p
+    n_cols = n_simple + len(c_edges)
 
-    elif 'S' in node:
-        p.remove(('A', -1))
-        s.append(('A', -1))
+    # Assemble, CSC so columns (edges) can be sliced cheaply
+    a_coup = sp.coo_matrix((np.concatenate(vals),
+                            (np.concatenate(rows), np.concatenate(cols))),
+                           shape=(n_rows, n_cols)).tocsc()
 
-        cycle_set = p
-        fixed_set = s
+    # Source edges of each column
+    a_edges = np.vstack(col_edges).astype(int)
 
-    return fixed_set, cycle_set
+    return a_coup, a_vertices, a_edges
 
 
-def reduce_to_coupled(a_extra, nodelist):
+def build_coupled_edges(table, source, target):
 
-    # reduce_to_coupled
-    # Given a_matrix with new coupled edges appended. Remove the split/merge
-    # vertices and their connected edges
-    #
-    # Inputs:   a_extra     -   a matrix with coupled edges appended
-    #           nodelist    -   order of vertices in incidence matrix
+    # new_coupled_edges
+    # given the graph's vertex table and edge arrays returns the coupled
+    # edges in coordinate form.
     #
-    # Outputs:  a_reduced   -   Incidence matrix without redundant edges
-
-    edges_to_remove = set()
-    required_vertices = []
-
-    for row, node in enumerate(nodelist):
-        required_vertices.append(row)
-
-        if 'M' in node or 'S' in node:
-
-            # remove from included vertices
-            required_vertices.pop()
-
-            # Find edges to remove
-            row = a_extra[row, :].nonzero()[1]
-            for e in row:
-                edges_to_remove.add(e)
-
-    # Therefore the included edges are the
-    required_edges = list(set(range(a_extra.shape[1])) - edges_to_remove)
-
-    # Reduce to only included vertices/edges
-    a_reduced = a_extra[np.ix_(required_vertices, required_edges)]
-
-    return a_reduced
-
-
-def adjust_capacity_edges(a_dense, nodelist):
-
-    # adjust_capacity_edges
-    # Account for the larger capacity edges in the graph by appending the
-    # specific edges to the matrix the required amount of times.
+    # When a merge vertex is in the solution its two L cells (-1) and the D
+    # vertex (+1) are fixed and one R successor (+1) varies. When a split
+    # vertex is in the solution its two R cells (+1) and the A vertex (-1)
+    # are fixed and one L predecessor (-1) varies. One coupled edge is made
+    # for each varying neighbour, i.e. for each M->R and L->S edge.
     #
-    # Inputs:   a_dense     -   incidence matrix
-    #           nodelist    -   order of rows in matrix
+    # Inputs:   table       - vertex table
+    #           source      - array of edge source vertex IDs
+    #           target      - array of edge target vertex IDs
     #
-    # Outputs:  a_cap       -   incidence matrix adjusted for edge capacity
+    # Outputs:  rows        - row of each non-zero entry
+    #           cols        - coupled edge (column) of each non-zero entry
+    #           vals        - value of each non-zero entry
+    #           col_edges   - (columns x 4) IDs of the graph edges through
+    #                         the split/merge vertex that make up each column
     #
 
-    a_cap = a_dense.copy()
-
-    # Coupled nodes
-    couple_vertices = [n for n in nodelist if 'M' not in n and 'S' not in n]
-
-    # Total nodes
-    l_nodes = sum(1 for x in couple_vertices if 'L' in x)
-
-    # Edge indices connected to nodes
-    a_e = np.nonzero(a_dense[couple_vertices.index('A'), :])[1]
-    d_e = np.nonzero(a_dense[couple_vertices.index('D'), :])[1]
-
-    # Edges
-    a_d = set(a_e).intersection(d_e).pop()
-
-    # Add Edges appropriate number of times
-    for x in xrange(1, l_nodes):
-        a_cap = np.hstack((a_cap, a_cap[:, a_d]))
-
-    return a_cap
+    kind = table.kind
+    l_start = table.start[L]
+    r_start = table.start[R]
+    a_id = table.start[A]
+    d_id = table.start[D]
+
+    # Edge ID lookup on (source, target), stored +1 so 0 means no edge
+    n_v = len(table)
+    edge_id = sp.csr_matrix((np.arange(1, len(source) + 1),
+                             (source, target)), shape=(n_v, n_v))
+
+    def lookup(u, v):
+        # no split/merge edges of this kind, sparse indexing with empty
+        # arrays does not give an empty result
+        if not u.size:
+            return -np.ones(u.shape, dtype=int)
+        return np.asarray(edge_id[u.ravel(), v.ravel()]).reshape(u.shape) - 1
+
+    # Merge coupled edges, one for each M->R edge
+    m_e = np.flatnonzero((kind[source] == M) & (kind[target] == R))
+    m_id = source[m_e]
+    m_pair = table.pair[m_id] + l_start
+    m_rows = np.column_stack((m_pair,
+                              np.repeat(d_id, len(m_e)),
+                              target[m_e]))
+    m_vals = np.tile([-1, -1, 1, 1], (len(m_rows), 1))
+    m_edges = np.column_stack((lookup(m_pair, np.tile(m_id, (2, 1)).T),
+                               lookup(m_id, np.repeat(d_id, len(m_e))),
+                               m_e))
+
+    # Split coupled edges, one for each L->S edge
+    s_e = np.flatnonzero((kind[source] == L) & (kind[target] == S))
+    s_id = target[s_e]
+    s_pair = table.pair[s_id] + r_start
+    s_rows = np.column_stack((s_pair,
+                              np.repeat(a_id, len(s_e)),
+                              source[s_e]))
+    s_vals = np.tile([1, 1, -1, -1], (len(s_rows), 1))
+    s_edges = np.column_stack((lookup(np.tile(s_id, (2, 1)).T, s_pair),
+                               lookup(np.repeat(a_id, len(s_e)), s_id),
+                               s_e))
+
+    rows = np.vstack((m_rows, s_rows)).astype(int)
+    vals = np.vstack((m_vals, s_vals)).astype(int)
+    cols = np.repeat(np.arange(len(rows)), 4)
+    col_edges = np.vstack((m_edges, s_edges)).astype(int).reshape(-1, 4)
+
+    return rows.ravel(), cols, vals.ravel(), col_edges
@@ -1,6 +1,12 @@
 # b_flow
 # Flow constraint vector
 
+# Import external packages
+import numpy as np
+
+# Import functions
+from ..graph.vertices import L, R, A, D
+
 __all__ = ["b_flow"]
 
 
@@ -13,31 +19,30 @@ def b_flow(a_vertices):
     # Having removed source and drain nodes. Now require:
     # L nodes = -1
     # R nodes = +1
-    # A node = -|L|
+    # A node = -|R|
     # D node = +|L|
     #
-    # Inputs:   a_vertices  - order of nodes in coupled matrix
+    # Inputs:   a_vertices  - order of nodes in coupled matrix (VertexTable)
     # Outputs:  b_flow      -   flow constraint vector.
     #
 
-    b = []
+    kind = a_vertices.kind
+
+    if np.any(kind > D):
+        print("Coupling matrix problems, there "
+              "remain split/merge vertices")
 
     # Total Cells
-    l_cells = sum(1 for x in a_vertices if 'L' in x)
-    r_cells = sum(1 for x in a_vertices if 'R' in x)
-
-    # run through nodes and adjust flow for source/drain
-    for node in a_vertices:
-        if 'L' in node:
-            b.append(-1)
-        elif 'R' in node:
-            b.append(1)
-        elif 'A' in node:
-            b.append(r_cells * (-1))
-        elif 'D' in node:
-            b.append(l_cells)
-        else:
-            print("Coupling matrix problems, there "
-                  "remain split/merge vertices")
+    l_cells = a_vertices.total(L)
+    r_cells = a_vertices.total(R)
+
+    # flow for each kind of vertex, adjusted for source/drain
+    flow = np.zeros(max(kind.max() + 1, D + 1), dtype=int)
+    flow[L] = -1
+    flow[R] = 1
+    flow[A] = r_cells * (-1)
+    flow[D] = l_cells
+
+    b = flow[kind].tolist()
 
     return b
@@ -6,93 +6,31 @@ import numpy as np
 __all__ = ["c_cost"]
 
 
-def c_cost(g, a_coup, a_vertices):
+def c_cost(g, a_coup, a_edges):
 
-    # TODO: think this function is slow. Check for performance increases.
     # c_cost
     # creates vector of costs for edges
     #
+    # Each column of the coupled matrix is made from the graph edges given
+    # by params.a_matrix, so the cost of every column is a gather and sum
+    # over the edge weight array.
+    #
     # Inputs:   g           - graph structure
     #           a_coup      - coupled incidence matrix
-    #           a_vertices  - order of rows in coupled matrix
+    #           a_edges     - (columns x 4) IDs of the graph edges of each
+    #                         column, -1 for padding, as params.a_matrix
     #
     # Outputs:  c           - list of costs for each edge in incidence matrix
     #
 
-    # Initialise cost vector
-    c = []
-
-    # For all edges in coupled matrix (iterating over transpose)
-    for e in a_coup.T:
-
-        # Get vertices connected by edge
-        vertex_indices = np.nonzero(e)
-        v = [a_vertices[i] for i in vertex_indices[1]]
-
-        # Get weights
-        cost = 0
-
-        # For simple edges
-        if len(v) == 2:
-            try:
-                cost = g[v[0]][v[1]]['weight']
-            except KeyError:
-                cost = g[v[1]][v[0]]['weight']
-
-        # For coupled edges
-        elif len(v) == 4:
-
-            # Find merge/split event label
-            ms_node = ms_event(v, g)
-
-            for n in v:
-                try:
-                    cost = cost + g.edge[n][ms_node]['weight']
-                except KeyError:
-                    cost = cost + g.edge[ms_node][n]['weight']
-
-        # Append to cost vector
-        c.append(cost)
-
-    return c
-
-
-def ms_event(vertices, graph):
-
-    # ms_event
-    # given 4 nodes find the split or merge vertex that they are connected to
-    #
-    # Inputs:   vertices    - list of 4 node labels
-    #           graph       - graph structure
-    # Outputs:  event_label - label of split/merge node
-    #
-
-    # initialise_out set
-    num = []
-    event = None
-
-    # split nodes
-    if 'D' in vertices:
-        event = 'M'
-
-        for n in vertices:
-            if 'L' in n:
-                num.append(''.join(i for i in n if i.isdigit()))
-
-    # merge nodes
-    elif 'A' in vertices:
-        event = 'S'
-
-        for n in vertices:
-            if 'R' in n:
-                num.append(''.join(i for i in n if i.isdigit()))
+    a_edges = np.asarray(a_edges)
 
-    # Combine to give event label
-    event_label = (event + '(' + num[0] + ',' + num[1] + ')')
+    if len(a_edges) != a_coup.shape[1]:
+        raise ValueError('Coupled matrix does not match the graph structure')
 
-    # Check if correct way around
-    if not graph.has_node(event_label):
-        event_label = (event + '(' + num[1] + ',' + num[0] + ')')
+    # Edge weights with a trailing zero so padding indexes to no cost
+    weight = np.append(g.graph['edges']['weight'], 0)
 
-    return event_label
+    c = weight[a_edges].sum(axis=1)
 
+    return c.tolist()
@@ -0,0 +1,44 @@
+# x_bound.py
+# Upper bound on the solution vector
+
+# Import external packages
+import numpy as np
+import scipy.sparse as sp
+
+# Import functions
+from ..graph.vertices import L, A, D
+
+__all__ = ["x_bound"]
+
+
+def x_bound(a_coup, a_vertices):
+
+    # x_bound
+    #
+    # Construct upper bound on solution vector
+    # (vector of size |E| x 1 giving the maximum flow along each edge.
+    # Every edge carries at most one unit of flow, except the A->D edge
+    # which carries the flow of the A/D vertices not otherwise used and so
+    # is bounded by the number of L cells.)
+    #
+    # Inputs:   a_coup      - coupled incidence matrix
+    #           a_vertices  - order of nodes in coupled matrix (VertexTable)
+    #
+    # Outputs:  x_bound     - upper bound vector
+    #
+
+    a_csc = sp.csc_matrix(a_coup)
+    u = np.ones(a_csc.shape[1], dtype=int)
+
+    # Total Cells
+    l_cells = a_vertices.total(L)
+
+    # A->D edge, the only column joining exactly those two vertices
+    a_row = a_csc[a_vertices.start[A], :].toarray().ravel()
+    d_row = a_csc[a_vertices.start[D], :].toarray().ravel()
+    n_entries = np.diff(a_csc.indptr)
+
+    a_d = (a_row == -1) & (d_row == 1) & (n_entries == 2)
+    u[a_d] = l_cells
+
+    return u.tolist()
@@ -1 +1,9 @@
-from .opto import opto
\ No newline at end of file
+from .opto import opto
+from .opto import available_backends
+from .session import Session
+from .session import relaxation_counts
+from .decode import decode
+from .assign import is_assignment
+from .assign import solve_assignment
+from .warm import greedy_start
+from .warm import motion
@@ -0,0 +1,134 @@
+# assign.py
+# Assignment fast path. When no coupled (split/merge) columns survive
+# pruning the coupled problem is a plain L -> R assignment with appear and
+# disappear, which is solved exactly as a linear assignment problem rather
+# than a MILP.
+
+# Import external packages
+import time
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import linear_sum_assignment
+
+# Import functions
+from ..graph.vertices import L, R, A, D
+
+__all__ = ['is_assignment', 'solve_assignment']
+
+
+def is_assignment(a_coup):
+
+    # is_assignment
+    # Whether the coupled problem is a pure assignment, i.e. every column is
+    # a simple edge (one source, one target) and there are no coupled
+    # split/merge columns
+    #
+    # Inputs:   a_coup      -   coupled incidence matrix
+    #
+    # Outputs:  True if solve_assignment can be used
+    #
+
+    a_csc = sp.csc_matrix(a_coup)
+
+    return bool(np.all(np.diff(a_csc.indptr) == 2))
+
+
+def solve_assignment(a_coup, b_flow, c_cost, x_bound, a_vertices):
+
+    # solve_assignment
+    # Solve a pure assignment problem (see is_assignment) with
+    # scipy.optimize.linear_sum_assignment on the padded cost matrix
+    #
+    #               R cells         L dummies
+    #   L cells   [ L->R costs    | L->D on diagonal ]
+    #   R dummies [ A->R diagonal | A->D everywhere  ]
+    #
+    # so each L cell moves or disappears, each R cell is reached by an L
+    # cell or appears, and the A->D edge carries one unit for each move, as
+    # the flow constraints require. Missing edges are given a prohibitive
+    # cost, if one is needed the problem is reported infeasible so the
+    # caller can fall back to the MILP.
+    #
+    # Inputs:   a_coup      -   coupled incidence matrix
+    #           b_flow      -   sum of flow for each vertex (unused, the
+    #                           flows of an assignment are implied)
+    #           c_cost      -   vector of edge costs
+    #           x_bound     -   upper bound on each edge
+    #           a_vertices  -   order of vertices in coupled matrix
+    #                           (VertexTable)
+    #
+    # Outputs:  x           -   integer solution vector, all zeros if no
+    #                           solution was found
+    #           info        -   dict of status, setup_time and solve_time
+    #
+
+    start = time.time()
+
+    a_csc = sp.csc_matrix(a_coup)
+    n_edges = a_csc.shape[1]
+    cost = np.asarray(c_cost, dtype=float)
+
+    n_l = a_vertices.total(L)
+    n_r = a_vertices.total(R)
+    kind = a_vertices.kind
+
+    # Source and target vertex of each column
+    rows = a_csc.indices.reshape(-1, 2)
+    vals = a_csc.data.reshape(-1, 2)
+    source = np.where(vals[:, 0] < 0, rows[:, 0], rows[:, 1])
+    target = np.where(vals[:, 0] < 0, rows[:, 1], rows[:, 0])
+    s_kind = kind[source]
+    t_kind = kind[target]
+    s_cell = source - a_vertices.start[L]
+    t_cell = target - a_vertices.start[R]
+
+    # Padded cost matrix and the column of each entry, -1 where there is
+    # no edge. Columns are entered in decreasing cost order so the cheapest
+    # of any parallel edges is kept.
+    n = n_l + n_r
+    column = -np.ones((n, n), dtype=int)
+
+    order = np.argsort(-cost, kind='mergesort')
+    s_kind, t_kind = s_kind[order], t_kind[order]
+    s_cell, t_cell = s_cell[order], t_cell[order]
+
+    move = (s_kind == L) & (t_kind == R)
+    column[s_cell[move], t_cell[move]] = order[move]
+
+    disappear = (s_kind == L) & (t_kind == D)
+    column[s_cell[disappear], n_r + s_cell[disappear]] = order[disappear]
+
+    appear = (s_kind == A) & (t_kind == R)
+    column[n_l + t_cell[appear], t_cell[appear]] = order[appear]
+
+    a_d = order[(s_kind == A) & (t_kind == D)]
+    if len(a_d):
+        column[n_l:, n_r:] = a_d[-1]
+
+    # Missing edges cost more than any complete assignment
+    big = np.abs(cost).sum() + 1 if n_edges else 1
+    padded = np.where(column >= 0, cost[column], big)
+
+    setup = time.time()
+
+    row_ind, col_ind = linear_sum_assignment(padded)
+
+    info = {'status': 'optimal',
+            'setup_time': setup - start,
+            'solve_time': time.time() - setup}
+
+    x = np.zeros(n_edges, dtype=int)
+    chosen = column[row_ind, col_ind]
+
+    if np.any(chosen < 0):
+        info['status'] = 'infeasible'
+        return x, info
+
+    # A->D carries one unit for each cell that moves
+    np.add.at(x, chosen, 1)
+
+    if np.any(x > np.asarray(x_bound)):
+        info['status'] = 'infeasible'
+        return np.zeros(n_edges, dtype=int), info
+
+    return x, info
@@ -0,0 +1,261 @@
+# backends.py
+# Matrix-form solver backends. The coupled matrix, flow vector, cost vector
+# and bounds are passed straight to the solver, with no modelling layer.
+
+# Import external packages
+import time
+import numpy as np
+import scipy.sparse as sp
+
+__all__ = ['constraint_bounds', 'is_integral', 'solve_glpk', 'glpk_status',
+           'glpk_start']
+
+
+def constraint_bounds(b_flow):
+
+    # constraint_bounds
+    # Row bounds for the flow constraints. As in the Pyomo model, L and R
+    # vertices need exact flow while the appear/disappear vertices are
+    # bounded above only.
+    #
+    # Inputs:   b_flow  -   sum of flow for each vertex
+    #
+    # Outputs:  lower   -   lower bound of each row (-inf if unbounded)
+    #           upper   -   upper bound of each row
+    #           exact   -   boolean, row is an equality constraint
+    #
+
+    upper = np.asarray(b_flow, dtype=float)
+    exact = np.abs(upper) <= 1
+    lower = np.where(exact, upper, -np.inf)
+
+    return lower, upper, exact
+
+
+def is_integral(x, tol=1e-6):
+
+    # is_integral
+    # Whether all values of a (relaxed) solution are integer, to within tol
+
+    x = np.asarray(x, dtype=float)
+
+    return bool(np.all(np.abs(x - np.round(x)) <= tol))
+
+
+def solve_glpk(a_coup, b_flow, c_cost, x_bound, lp=None, x_start=None,
+               relax=False):
+
+    # solve_glpk
+    # Solve in-process with GLPK's matrix API through the swiglpk bindings,
+    # no model or LP file is written and no glpsol process is spawned.
+    #
+    # Inputs:   a_coup      -   coupled incidence matrix
+    #           b_flow      -   sum of flow for each vertex
+    #           c_cost      -   vector of edge costs
+    #           x_bound     -   upper bound on each edge
+    #           lp          -   optional GLPK problem object to reuse, it is
+    #                           erased rather than deleted afterwards
+    #           x_start     -   optional feasible starting solution, the
+    #                           LP relaxation is solved first with the
+    #                           simplex method starting from its basis
+    #                           (see glpk_start) and the MIP solver then
+    #                           starts from the LP's optimal basis
+    #           relax       -   solve the LP relaxation first and only
+    #                           run the MIP solver, from the LP's optimal
+    #                           basis, if it is not integral
+    #
+    # Outputs:  x           -   integer solution vector, all zeros if no
+    #                           solution was found
+    #           info        -   dict of status, setup_time and solve_time
+    #                           (and warm_start if x_start was given,
+    #                           relaxation if relax: 'integral' or
+    #                           'fallback')
+    #
+
+    import swiglpk as glpk
+
+    start = time.time()
+
+    n_vertices, n_edges = a_coup.shape
+    lower, upper, exact = constraint_bounds(b_flow)
+
+    reuse = lp is not None
+    if reuse:
+        glpk.glp_erase_prob(lp)
+    else:
+        lp = glpk.glp_create_prob()
+    glpk.glp_set_obj_dir(lp, glpk.GLP_MIN)
+
+    # Rows, flow constraints
+    glpk.glp_add_rows(lp, n_vertices)
+    for i in xrange(n_vertices):
+        if exact[i]:
+            glpk.glp_set_row_bnds(lp, i+1, glpk.GLP_FX, upper[i], upper[i])
+        else:
+            glpk.glp_set_row_bnds(lp, i+1, glpk.GLP_UP, 0.0, upper[i])
+
+    # Columns, integer edge variables with cost
+    glpk.glp_add_cols(lp, n_edges)
+    for j in xrange(n_edges):
+        glpk.glp_set_col_kind(lp, j+1, glpk.GLP_IV)
+        glpk.glp_set_col_bnds(lp, j+1, glpk.GLP_DB, 0.0, float(x_bound[j]))
+        glpk.glp_set_obj_coef(lp, j+1, float(c_cost[j]))
+
+    # Constraint matrix, GLPK indices are 1-based (as_*Array fills the
+    # arrays from element 1)
+    a_coo = sp.coo_matrix(a_coup)
+    ia = glpk.as_intArray((a_coo.row + 1).tolist())
+    ja = glpk.as_intArray((a_coo.col + 1).tolist())
+    ar = glpk.as_doubleArray(a_coo.data.astype(float).tolist())
+    glpk.glp_load_matrix(lp, a_coo.nnz, ia, ja, ar)
+
+    started = (x_start is not None and
+               glpk_start(lp, a_coup, b_flow, x_bound, x_start))
+
+    setup = time.time()
+
+    parm = glpk.glp_iocp()
+    glpk.glp_init_iocp(parm)
+    parm.msg_lev = glpk.GLP_MSG_OFF
+    term_out = glpk.glp_term_out(glpk.GLP_OFF)
+
+    # LP relaxation, for the relaxation check or as the starting point of
+    # the MIP solver when given a starting solution
+    relaxed = None
+    if relax or x_start is not None:
+        smcp = glpk.glp_smcp()
+        glpk.glp_init_smcp(smcp)
+        smcp.msg_lev = glpk.GLP_MSG_OFF
+
+        # The presolver would discard the starting basis
+        smcp.presolve = glpk.GLP_OFF if started else glpk.GLP_ON
+        ret = glpk.glp_simplex(lp, smcp)
+        if ret != 0 and started:
+            # Starting basis singular, solve from scratch
+            started = False
+            smcp.presolve = glpk.GLP_ON
+            ret = glpk.glp_simplex(lp, smcp)
+
+        if ret == 0 and glpk.glp_get_status(lp) == glpk.GLP_OPT:
+            relaxed = np.array([glpk.glp_get_col_prim(lp, j+1)
+                                for j in xrange(n_edges)])
+
+    if relax and relaxed is not None and is_integral(relaxed):
+        # LP solution is integral, so optimal for the MILP too
+        status = 'optimal'
+    else:
+        if relaxed is not None:
+            # MIP from the optimal LP basis
+            parm.presolve = glpk.GLP_OFF
+        else:
+            # Solve, presolver finds the LP relaxation itself
+            parm.presolve = glpk.GLP_ON
+        ret = glpk.glp_intopt(lp, parm)
+        status = glpk_status(lp, ret)
+        relaxed = None
+
+    glpk.glp_term_out(term_out)
+
+    info = {'status': status,
+            'setup_time': setup - start,
+            'solve_time': time.time() - setup}
+
+    if x_start is not None:
+        info['warm_start'] = 'used' if started else 'unused'
+
+    if relax:
+        info['relaxation'] = 'integral' if relaxed is not None else 'fallback'
+
+    x = np.zeros(n_edges, dtype=int)
+    if relaxed is not None:
+        x = np.round(relaxed).astype(int)
+    elif info['status'] in ('optimal', 'feasible'):
+        for j in xrange(n_edges):
+            x[j] = int(round(glpk.glp_mip_col_val(lp, j+1)))
+
+    if not reuse:
+        glpk.glp_delete_prob(lp)
+
+    return x, info
+
+
+def glpk_start(lp, a_coup, b_flow, x_bound, x_start):
+
+    # glpk_start
+    # Set the simplex starting basis of a GLPK problem object to the vertex
+    # of a feasible integer solution, in-process through glp_set_col_stat
+    # and glp_set_row_stat. Columns at a bound are non-basic at that bound.
+    # A column between its bounds (e.g. the A->D column) is basic in place
+    # of the auxiliary variable of one of its tight rows. All other row
+    # auxiliary variables are basic. The basis is not checked for
+    # singularity, glp_simplex reports that.
+    #
+    # Inputs:   lp          -   GLPK problem object with the problem loaded
+    #           a_coup      -   coupled incidence matrix
+    #           b_flow      -   sum of flow for each vertex
+    #           x_bound     -   upper bound on each edge
+    #           x_start     -   feasible integer solution vector
+    #
+    # Outputs:  True if the basis was set, False if a column between its
+    #           bounds has no tight row left to replace
+    #
+
+    import swiglpk as glpk
+
+    x_start = np.asarray(x_start)
+    x_bound = np.asarray(x_bound)
+    a_csc = sp.csc_matrix(a_coup)
+    lower, upper, exact = constraint_bounds(b_flow)
+
+    # Rows whose auxiliary variable is at a bound, and can leave the basis
+    tight = exact | (a_csc.dot(x_start) == upper)
+    row_basic = np.ones(a_csc.shape[0], dtype=bool)
+
+    col_stat = []
+    for j, value in enumerate(x_start.tolist()):
+        if value == 0:
+            col_stat.append(glpk.GLP_NL)
+        elif value == x_bound[j]:
+            col_stat.append(glpk.GLP_NU)
+        else:
+            rows = a_csc.indices[a_csc.indptr[j]:a_csc.indptr[j+1]]
+            rows = rows[row_basic[rows] & tight[rows]]
+            if not len(rows):
+                return False
+            row_basic[rows[0]] = False
+            col_stat.append(glpk.GLP_BS)
+
+    for j, stat in enumerate(col_stat):
+        glpk.glp_set_col_stat(lp, j+1, stat)
+
+    for i in xrange(len(row_basic)):
+        if row_basic[i]:
+            stat = glpk.GLP_BS
+        else:
+            stat = glpk.GLP_NS if exact[i] else glpk.GLP_NU
+        glpk.glp_set_row_stat(lp, i+1, stat)
+
+    return True
+
+
+def glpk_status(lp, ret):
+
+    # glpk_status
+    # Status of a GLPK MIP solve as a string
+    #
+    # Inputs:   lp      -   GLPK problem object
+    #           ret     -   return code of glp_intopt
+    #
+    # Outputs:  status  -   'optimal', 'feasible', 'infeasible' or 'error'
+
+    import swiglpk as glpk
+
+    if ret in (glpk.GLP_ENOPFS, glpk.GLP_ENODFS):
+        return 'infeasible'
+    if ret != 0:
+        return 'error'
+
+    return {glpk.GLP_OPT: 'optimal',
+            glpk.GLP_FEAS: 'feasible',
+            glpk.GLP_NOFEAS: 'infeasible'}.get(glpk.glp_mip_status(lp),
+                                               'error')
@@ -0,0 +1,165 @@
+# components.py
+# Spatial decomposition of a frame pair. Cells in different regions of the
+# field never compete for the same association, so the coupled problem
+# splits into independent subproblems, one for each connected component of
+# the pruned graph once the shared A and D vertices are left out.
+
+# Import external packages
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+# Import functions
+from ..graph.vertices import VertexTable, L, R, A, D
+
+__all__ = ['components', 'subproblem', 'merge']
+
+
+def components(a_coup, a_vertices):
+
+    # components
+    # Connected components of the coupled problem, ignoring the A and D
+    # vertices. Two cell vertices are connected when a column joins them.
+    #
+    # Every component is solved with its own copy of the A->D column. Its
+    # flow in each component is fixed by the component's cells (one unit
+    # for each move, split and merge), so the flows of the copies sum to
+    # that of the whole problem and the decomposition is exact.
+    #
+    # Inputs:   a_coup      -   coupled incidence matrix
+    #           a_vertices  -   order of vertices in coupled matrix
+    #                           (VertexTable)
+    #
+    # Outputs:  parts       -   list of (rows, cols) arrays, the vertex IDs
+    #                           and column indices of each component (without
+    #                           A, D and the A->D column)
+    #           a_d         -   column index of the A->D edge, -1 if none
+    #
+
+    a_csc = sp.csc_matrix(a_coup)
+    n_rows, n_cols = a_csc.shape
+
+    # Incidence of the cell vertices only
+    cell = np.ones(n_rows, dtype=bool)
+    cell[[a_vertices.start[A], a_vertices.start[D]]] = False
+    a_coo = a_csc.tocoo()
+    keep = cell[a_coo.row]
+    incidence = sp.coo_matrix((np.ones(keep.sum()),
+                               (a_coo.row[keep], a_coo.col[keep])),
+                              shape=(n_rows, n_cols))
+
+    # Components of the bipartite vertex/column graph
+    graph = sp.bmat([[None, incidence], [incidence.T, None]]).tocsr()
+    n, labels = connected_components(graph, directed=False)
+    row_label = labels[:n_rows]
+    col_label = labels[n_rows:]
+
+    # The A->D column is the only one with no cell vertex
+    col_cells = np.bincount(a_coo.col[keep], minlength=n_cols)
+    a_d = np.flatnonzero(col_cells == 0)
+    a_d = int(a_d[0]) if len(a_d) else -1
+
+    # Vertex IDs and columns of each component, in order
+    rows = np.flatnonzero(cell)
+    row_order = rows[np.argsort(row_label[rows], kind='mergesort')]
+    row_bounds = np.searchsorted(row_label[row_order],
+                                 np.unique(row_label[rows]))
+
+    cols = np.flatnonzero(col_cells > 0)
+    col_order = cols[np.argsort(col_label[cols], kind='mergesort')]
+
+    parts = []
+    for rows_k in np.split(row_order, row_bounds[1:]):
+        if not len(rows_k):
+            continue
+        k = row_label[rows_k[0]]
+        lo, hi = np.searchsorted(col_label[col_order], [k, k + 1])
+        parts.append((rows_k, col_order[lo:hi]))
+
+    return parts, a_d
+
+
+def subproblem(a_coup, c_cost, x_bound, a_vertices, rows, cols, a_d,
+               x_start=None):
+
+    # subproblem
+    # Coupled problem of one component, its cell vertices with A and D and
+    # its columns with the A->D column (last)
+    #
+    # Inputs:   a_coup      -   coupled incidence matrix
+    #           c_cost      -   vector of edge costs
+    #           x_bound     -   upper bound on each edge
+    #           a_vertices  -   order of vertices in coupled matrix
+    #           rows, cols  -   component, as returned by components
+    #           a_d         -   column index of the A->D edge, -1 if none
+    #           x_start     -   optional starting solution of the whole
+    #                           problem
+    #
+    # Outputs:  a_sub       -   coupled incidence matrix of the component
+    #           b_sub       -   flow vector
+    #           c_sub       -   cost vector
+    #           u_sub       -   bound vector
+    #           v_sub       -   order of vertices (VertexTable)
+    #           x_sub       -   starting solution of the component, None if
+    #                           no x_start
+    #
+
+    # Vertex IDs stay in L, R, A, D order
+    rows = np.sort(np.concatenate((rows, [a_vertices.start[A],
+                                          a_vertices.start[D]])))
+    if a_d >= 0:
+        cols = np.append(cols, a_d)
+
+    kind = a_vertices.kind[rows]
+    v_sub = VertexTable([a_vertices[i] for i in rows.tolist()], kind,
+                        a_vertices.cell[rows], a_vertices.pair[rows])
+
+    a_sub = sp.csc_matrix(a_coup)[rows, :][:, cols]
+
+    # Flows and bounds, as params.b_flow and params.x_bound
+    n_l = int(np.sum(kind == L))
+    n_r = int(np.sum(kind == R))
+    flow = np.array([-1, 1, -n_r, n_l])
+    b_sub = flow[kind].tolist()
+
+    c_sub = np.asarray(c_cost)[cols].tolist()
+    u_sub = np.asarray(x_bound)[cols]
+    if a_d >= 0:
+        u_sub[-1] = n_l
+
+    # Start of the component, its A->D flow makes up the R cells not
+    # reached through A
+    x_sub = None
+    if x_start is not None:
+        x_sub = np.asarray(x_start)[cols]
+        if a_d >= 0:
+            a_row = int(np.flatnonzero(kind == A)[0])
+            a_used = -a_sub[a_row, :-1].dot(x_sub[:-1]).sum()
+            x_sub[-1] = n_r - a_used
+
+    return a_sub, b_sub, c_sub, u_sub.tolist(), v_sub, x_sub
+
+
+def merge(n_edges, parts, a_d, solutions):
+
+    # merge
+    # Solution vector of the whole problem from those of its components
+    #
+    # Inputs:   n_edges     -   number of columns of the whole problem
+    #           parts       -   components, as returned by components
+    #           a_d         -   column index of the A->D edge, -1 if none
+    #           solutions   -   solution vector of each component
+    #
+    # Outputs:  x           -   integer solution vector
+    #
+
+    x = np.zeros(n_edges, dtype=int)
+
+    for (rows, cols), x_k in zip(parts, solutions):
+        x_k = np.asarray(x_k)
+        if a_d >= 0:
+            x[a_d] += x_k[-1]
+            x_k = x_k[:-1]
+        x[cols] = x_k
+
+    return x
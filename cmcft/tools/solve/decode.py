@@ -0,0 +1,97 @@
+# decode.py
+# Decode the solution of the optimisation into cell associations
+
+# Import external packages
+import numpy as np
+import scipy.sparse as sp
+
+# Import functions
+from ..graph.vertices import L, R, A, D
+
+__all__ = ['MOVE', 'APPEAR', 'DISAPPEAR', 'SPLIT', 'MERGE', 'EVENTS',
+           'decode']
+
+# Association event types
+MOVE, APPEAR, DISAPPEAR, SPLIT, MERGE = range(5)
+EVENTS = ('move', 'appear', 'disappear', 'split', 'merge')
+
+
+def decode(a_coup, x, a_vertices):
+
+    # decode
+    # Association table of a solution, found from the sparse columns of the
+    # selected edges in one pass. There is one association for each R cell
+    # and one for each L cell that disappears:
+    #
+    #   move        L -> R
+    #   appear      A -> R
+    #   disappear   L -> D
+    #   split       L -> R, one for each of the two R cells
+    #   merge       (L, L) -> R
+    #
+    # Associations are in order of successor vertex ID.
+    #
+    # Inputs:   a_coup      -   coupled incidence matrix
+    #           x           -   solution vector
+    #           a_vertices  -   order of vertices in coupled matrix
+    #                           (VertexTable)
+    #
+    # Outputs:  assoc       -   dict of arrays:
+    #                           pred  - (n x 2) vertex IDs of predecessors,
+    #                                   padded with -1. The A vertex for
+    #                                   appearances.
+    #                           succ  - (n) vertex ID of successor
+    #                           event - (n) event type, one of MOVE, APPEAR,
+    #                                   DISAPPEAR, SPLIT, MERGE
+    #
+
+    # Selected edges, the A->D edge may carry more than one unit of flow
+    selected = np.flatnonzero(np.asarray(x) == 1)
+
+    if not len(selected):
+        raise ValueError('Optimiser did not find a solution')
+
+    a_sol = sp.csc_matrix(a_coup)[:, selected].tocoo()
+    n_cols = len(selected)
+
+    # Entries in column order, then row (vertex ID) order
+    order = np.lexsort((a_sol.row, a_sol.col))
+    col = a_sol.col[order]
+    row = a_sol.row[order]
+    val = a_sol.data[order]
+    kind = a_vertices.kind[row]
+
+    # L predecessors and R successors of each column
+    pred_l = (val < 0) & (kind == L)
+    succ_r = (val > 0) & (kind == R)
+    n_pred = np.bincount(col[pred_l], minlength=n_cols)
+    n_succ = np.bincount(col[succ_r], minlength=n_cols)
+
+    # Predecessors of each column, the A vertex if the cell appeared
+    pred = -np.ones((n_cols, 2), dtype=int)
+    l_col = col[pred_l]
+    first = np.searchsorted(l_col, l_col)
+    pred[l_col, np.arange(len(l_col)) - first] = row[pred_l]
+    pred[n_pred == 0, 0] = a_vertices.start[A]
+
+    # Event of each column
+    event = np.repeat(MOVE, n_cols)
+    event[n_pred == 0] = APPEAR
+    event[n_succ == 0] = DISAPPEAR
+    event[n_succ == 2] = SPLIT
+    event[n_pred == 2] = MERGE
+
+    # One association for each R successor and for each L->D column, the
+    # A->D column and the D entry of merges give none
+    succ = succ_r | ((val > 0) & (kind == D) & (n_pred[col] == 1) &
+                     (n_succ[col] == 0))
+    succ_col = col[succ]
+    succ_id = row[succ]
+
+    order = np.lexsort((pred[succ_col, 0], succ_id))
+
+    assoc = {'pred': pred[succ_col][order],
+             'succ': succ_id[order],
+             'event': event[succ_col][order]}
+
+    return assoc
@@ -3,10 +3,23 @@
 
 
 # Import
-from pyomo.environ import *
+import time
+import numpy as np
+import scipy.sparse as sp
 
+# Pyomo is optional, only needed by the 'pyomo' backend
+try:
+    from pyomo.environ import *
+except ImportError:
+    pass
 
-def opto(a_coup, b_flow, c_cost):
+# Import functions
+import backends
+
+__all__ = ['opto', 'available_backends', 'BACKENDS']
+
+
+def opto(a_coup, b_flow, c_cost, x_bound=None, backend='auto'):
 
     # opto
     # Function to set up the model and call the optimisation engine
@@ -14,42 +27,259 @@ def opto(a_coup, b_flow, c_cost):
     # Inputs:   a_coup      -   coupled incidence matrix
     #           b_flow      -   sum of flow for each vertex
     #           c_cost      -   vector of edge costs
+    #           x_bound     -   upper bound on each edge, default 1
+    #           backend     -   solver backend, one of BACKENDS or 'auto'
+    #                           for the first available of 'glpk' and
+    #                           'pyomo'
+    #
+    # Outputs:  sol         -   integer solution vector
+    #
+
+    if x_bound is None:
+        x_bound = [1] * a_coup.shape[1]
+
+    if backend == 'auto':
+        backend = available_backends()[0]
+
+    if backend not in BACKENDS:
+        raise ValueError('Unknown solver backend: ' + str(backend))
+
+    sol, info = BACKENDS[backend](a_coup, b_flow, c_cost, x_bound)
+
+    return sol
+
+
+def available_backends():
+
+    # available_backends
+    # Backends whose dependencies can be imported, in order of preference
+    #
+    # Outputs:  names   - list of backend names
+
+    names = []
+
+    try:
+        import swiglpk
+        names.append('glpk')
+    except ImportError:
+        pass
+
+    try:
+        import pyomo.environ
+        names.append('pyomo')
+    except ImportError:
+        pass
+
+    if not names:
+        raise ImportError('No solver backend available, install swiglpk or'
+                          ' Pyomo')
+
+    return names
+
+
+def solve_pyomo(a_coup, b_flow, c_cost, x_bound, opt=None, x_start=None,
+                relax=False):
+
+    # solve_pyomo
+    # Build the Pyomo model and solve with GLPK (glpsol)
+    #
+    # Inputs:   a_coup      -   coupled incidence matrix
+    #           b_flow      -   sum of flow for each vertex
+    #           c_cost      -   vector of edge costs
+    #           x_bound     -   upper bound on each edge
+    #           opt         -   optional Pyomo solver plugin to reuse
+    #           x_start     -   optional starting solution, passed on if
+    #                           the solver plugin takes warm starts (the
+    #                           GLPK plugin does not)
+    #           relax       -   solve the LP relaxation first (continuous
+    #                           variables) and only solve the MILP if it
+    #                           is not integral
     #
-    # Outputs:  sol         -   solution vector
+    # Outputs:  x           -   integer solution vector, all zeros if no
+    #                           solution was found
+    #           info        -   dict of status, setup_time and solve_time.
+    #                           solve_time includes writing the LP file,
+    #                           running glpsol and reading its output.
+    #                           warm_start if x_start was given,
+    #                           relaxation if relax: 'integral' or
+    #                           'fallback'.
     #
 
+    start = time.time()
+
     # build model
-    model = model_construct(a_coup, b_flow, c_cost)
+    model = model_construct(a_coup, b_flow, c_cost, x_bound)
+
+    if opt is None:
+        from pyomo.opt import SolverFactory
+        opt = SolverFactory('glpk')
+
+    # starting values, if the solver takes them
+    warm = x_start is not None and opt.warm_start_capable()
+    if warm:
+        for j, value in enumerate(np.asarray(x_start).tolist()):
+            model.x[j].value = value
+
+    setup = time.time()
+
+    # LP relaxation, used if its solution is integral
+    relaxed = False
+    if relax:
+        for j in model.j:
+            model.x[j].domain = NonNegativeReals
+        x_data, status = solve(model, opt=opt)
+        values = [x_data[j].value for j in model.j]
+        relaxed = (status == 'optimal' and None not in values and
+                   backends.is_integral(values))
+        for j in model.j:
+            model.x[j].domain = NonNegativeIntegers
+            if warm:
+                model.x[j].value = int(x_start[j])
 
     # solve
-    sol = solve(model)
+    if not relaxed:
+        x_data, status = solve(model, opt=opt, warmstart=warm)
 
-    return sol
+    info = {'status': status,
+            'setup_time': setup - start,
+            'solve_time': time.time() - setup}
+
+    if x_start is not None:
+        info['warm_start'] = 'used' if warm else 'unsupported'
+
+    if relax:
+        info['relaxation'] = 'integral' if relaxed else 'fallback'
+
+    x = np.zeros(a_coup.shape[1], dtype=int)
+    for j in xrange(len(x)):
+        if x_data[j].value is not None:
+            x[j] = int(round(x_data[j].value))
 
+    return x, info
 
-def model_construct(a_coup, b_flow, c_cost):
+
+def model_construct(a_coup, b_flow, c_cost, x_bound=None):
 
     # construct pyomo model
+    # The coupled matrix is very sparse (two or four entries per column) so
+    # the model is built from its non-zero entries only. The incidence
+    # parameter is indexed by the non-zero (i, j) pairs and each flow
+    # constraint sums over the non-zero columns of its CSR row, so model
+    # size (and the LP file written for GLPK) scales with non-zeros.
+    #
+    # Inputs:   a_coup      -   coupled incidence matrix
+    #           b_flow      -   sum of flow for each vertex
+    #           c_cost      -   vector of edge costs
+    #           x_bound     -   upper bound on each edge, default 1
+    #
+    # Outputs:  model       -   pyomo model object
+
+    a_csr = sp.csr_matrix(a_coup)
+    a_coo = a_csr.tocoo()
+
+    if x_bound is None:
+        x_bound = [1] * a_csr.shape[1]
+
+    # Creation of a Concrete Model
+    model = ConcreteModel()
+
+    # Define sets
+    vertices = range(a_csr.shape[0])
+    edges = range(a_csr.shape[1])
+    non_zero = list(zip(a_coo.row.tolist(), a_coo.col.tolist()))
+    model.i = Set(initialize=vertices, doc='vertices')
+    model.j = Set(initialize=edges, doc='edges')
+    model.nz = Set(dimen=2, initialize=non_zero,
+                   doc='non-zero entries of coupled incidence')
+
+    # Define parameters
+    # Table a(i,j)  coupled incidence matrix, non-zero entries only
+    a_values = dict(zip(non_zero, a_coo.data.tolist()))
+    model.a = Param(model.nz, initialize=a_values, doc='coupled incidence')
+
+    # cost vector
+    def c_init(model, j):
+        return c_cost[j]
+    model.c = Param(model.j, initialize=c_init, doc='cost vector')
+
+    # flow vector
+    def b_init(model, i):
+        return b_flow[i]
+    model.b = Param(model.i, initialize=b_init, doc='flow vector')
+
+    # Define variables
+    # Binary apart from the higher capacity A->D edge
+    def x_bounds(model, j):
+        return 0, x_bound[j]
+    model.x = Var(model.j, domain=NonNegativeIntegers, bounds=x_bounds,
+                  doc='solution vector 1 if column is included 0 otherwise')
+
+    # Define constraints - slightly modified from paper because no source/sink
+    def flow_rule(model, i):
+        cols = a_csr.indices[a_csr.indptr[i]:a_csr.indptr[i+1]].tolist()
+
+        # vertex with no edges, constraint is a constant
+        if not cols:
+            if -1 <= b_flow[i] <= 1:
+                feasible = b_flow[i] == 0
+            else:
+                feasible = b_flow[i] >= 0
+            return Constraint.Skip if feasible else Constraint.Infeasible
+
+        flow_sum = sum(model.a[i, j]*model.x[j] for j in cols)
+
+        # for the L and R nodes we need to ensure exact flow
+        if -1 <= model.b[i] <= 1:
+            flow = flow_sum == model.b[i]
+        # but the appear/disappear nodes are more flexible
+        else:
+            flow = flow_sum <= model.b[i]
+        return flow
+
+    model.constrain = Constraint(model.i, rule=flow_rule,
+                                 doc='Flow Constraints')
+
+    # Define Objective
+    obj_expr = sum(model.c[j]*model.x[j] for j in model.j)
+    model.objective = Objective(expr=obj_expr, sense=minimize,
+                                doc='Define objective function')
+
+    return model
+
+
+def model_construct_dense(a_coup, b_flow, c_cost, x_bound=None):
+
+    # construct pyomo model, dense
+    # Original construction with a parameter for every element of the
+    # coupled matrix and constraints summing over every edge. Kept for
+    # benchmarking against model_construct (see profile_model.py).
     #
     # Inputs:   a_coup      -   coupled incidence matrix
     #           b_flow      -   sum of flow for each vertex
     #           c_cost      -   vector of edge costs
+    #           x_bound     -   upper bound on each edge, default 1
     #
     # Outputs:  model       -   pyomo model object
 
+    # Parameter table is dense
+    a_dense = a_coup.toarray() if hasattr(a_coup, 'toarray') else a_coup
+
+    if x_bound is None:
+        x_bound = [1] * a_dense.shape[1]
+
     # Creation of a Concrete Model
     model = ConcreteModel()
 
     # Define sets
-    vertices = range(a_coup.shape[0])
-    edges = range(a_coup.shape[1])
+    vertices = range(a_dense.shape[0])
+    edges = range(a_dense.shape[1])
     model.i = Set(initialize=vertices, doc='vertices')
     model.j = Set(initialize=edges, doc='edges')
 
     # Define parameters
     # Table a(i,j)  coupled incidence matrix
     def a_init(model, i, j):
-        return a_coup.item(i, j)
+        return a_dense.item(i, j)
     model.a = Param(model.i, model.j, initialize=a_init,
                     doc='coupled incidence')
 
@@ -64,7 +294,10 @@ def model_construct(a_coup, b_flow, c_cost):
     model.b = Param(model.i, initialize=b_init, doc='flow vector')
 
     # Define variables
-    model.x = Var(model.j, domain=Binary,
+    # Binary apart from the higher capacity A->D edge
+    def x_bounds(model, j):
+        return 0, x_bound[j]
+    model.x = Var(model.j, domain=NonNegativeIntegers, bounds=x_bounds,
                   doc='solution vector 1 if column is included 0 otherwise')
 
     # Define constraints - slightly modified from paper because no source/sink
@@ -88,24 +321,40 @@ def model_construct(a_coup, b_flow, c_cost):
     return model
 
 
-def solve(model):
+def solve(model, opt=None, warmstart=False):
 
     # solve
     # calls the GLPK solver and finds solution
     #
     # Inputs:   model   -   Pyomo model object
-    # Outputs:  x       -   binary |E|x1 solution vector that is 1 if the
-    #                       row is in the solution and 0 otherwise.
+    #           opt     -   optional Pyomo solver plugin to reuse
+    #           warmstart -   start from the values of model.x
+    # Outputs:  x       -   |E|x1 solution vector that is 1 if the
+    #                       row is in the solution and 0 otherwise (the A->D
+    #                       edge may take larger values).
+    #           status  -   solver termination condition
+    #
 
     # This is an optional code path that allows the script to be
     # run outside of Pyomo command-line.  For example:  python transport.py
     # This replicates what the Pyomo command-line tools does
-    from pyomo.opt import SolverFactory
-    opt = SolverFactory("glpk")
-    results = opt.solve(model)
+    if opt is None:
+        from pyomo.opt import SolverFactory
+        opt = SolverFactory("glpk")
+    if warmstart:
+        results = opt.solve(model, warmstart=True)
+    else:
+        results = opt.solve(model)
 
     # save results
     model.solutions.load_from(results)
     x = model.x._data
+    status = str(results.solver.termination_condition)
+
+    return x, status
+
 
-    return x
+# Solver backends, each called as backend(a_coup, b_flow, c_cost, x_bound)
+# and returning (x, info)
+BACKENDS = {'glpk': backends.solve_glpk,
+            'pyomo': solve_pyomo}
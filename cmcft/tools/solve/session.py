@@ -0,0 +1,379 @@
+# session.py
+# Solver session kept for the whole image sequence, so the solver is set up
+# once rather than once per frame pair.
+
+# Import external packages
+import time
+import collections
+import multiprocessing
+import numpy as np
+
+# Import
+import assign
+import components as decompose
+import opto
+import warm
+
+__all__ = ['Session', 'relaxation_counts']
+
+# Number of most recent solves kept in Session.stats
+STATS_SIZE = 1000
+
+
+class Session(object):
+
+    # Session
+    # Solver session created once in track.track and used for every frame
+    # pair. The solver itself stays alive between frames: the 'glpk' backend
+    # reuses one in-process GLPK problem object (erased, not reallocated,
+    # each frame) and the 'pyomo' backend reuses one solver plugin. Each
+    # solve records its status and timings, split into setup and solve.
+    #
+    # Attributes:   backend - name of the solver backend
+    #               assignment - use the assignment fast path, see solve_part
+    #               components - solve connected components separately, see
+    #                         solve_components
+    #               warm_start - False, True or 'compare', see solve
+    #               relax   - solve the LP relaxation first, see solve_part
+    #               stats   - dicts of solve stats of the most recent
+    #                         solves (up to keep_stats), see solve
+    #               n_solves - number of solves so far
+    #
+
+    def __init__(self, backend='auto', assignment=True, components=False,
+                 component_workers=None, warm_start=False, relax=False,
+                 keep_stats=STATS_SIZE):
+
+        if backend == 'auto':
+            backend = opto.available_backends()[0]
+
+        if backend not in opto.BACKENDS:
+            raise ValueError('Unknown solver backend: ' + str(backend))
+
+        self.backend = backend
+        self.assignment = assignment
+        self.components = components
+        self.warm_start = warm_start
+        self.relax = relax
+        self.stats = collections.deque(maxlen=keep_stats)
+        self.n_solves = 0
+        self._relaxation = relaxation_counts([])
+        self._state = {}
+        self._pool = None
+
+        if (components and component_workers and component_workers > 1 and
+                not multiprocessing.current_process().daemon):
+            self._pool = multiprocessing.Pool(component_workers,
+                                              init_component_worker,
+                                              (backend, assignment, relax))
+
+        if backend == 'glpk':
+            import swiglpk as glpk
+            self._state['lp'] = glpk.glp_create_prob()
+        elif backend == 'pyomo':
+            from pyomo.opt import SolverFactory
+            self._state['opt'] = SolverFactory('glpk')
+
+    def solve(self, a_coup, b_flow, c_cost, x_bound=None, frame=None,
+              vertices=None, x_start=None, start_time=None):
+
+        # solve
+        # Solve one frame pair with the session's solver. Stats of the solve
+        # are added to stats: frame, backend, status, setup_time, solve_time
+        # (for 'pyomo' this includes writing the LP file and running
+        # glpsol), n_vertices, n_edges and objective, and those of
+        # solve_part and solve_components.
+        #
+        # A starting solution (see solve.warm) is given to backends that
+        # take starts ('glpk' as its simplex starting basis; Pyomo's GLPK
+        # plugin does not). With
+        # warm_start 'compare' the pair is also solved cold, so stats show
+        # the time the start saves.
+        #
+        # Inputs:   a_coup      -   coupled incidence matrix
+        #           b_flow      -   sum of flow for each vertex
+        #           c_cost      -   vector of edge costs
+        #           x_bound     -   upper bound on each edge, default 1
+        #           frame       -   optional frame number recorded in stats
+        #           vertices    -   order of vertices in coupled matrix
+        #                           (VertexTable), needed for the
+        #                           assignment fast path
+        #           x_start     -   optional starting solution. Stats then
+        #                           hold warm_start ('used', 'unsupported',
+        #                           'unused' or 'infeasible'),
+        #                           start_objective and, when comparing,
+        #                           cold_time and warm_start_saving (cold
+        #                           setup + solve time less warm, and less
+        #                           start_time).
+        #           start_time  -   optional time taken to build x_start,
+        #                           recorded in stats
+        #
+        # Outputs:  x           -   integer solution vector
+        #
+
+        if x_bound is None:
+            x_bound = [1] * a_coup.shape[1]
+
+        problem = (a_coup, b_flow, c_cost, x_bound, vertices)
+        start_status = None
+
+        if x_start is not None:
+            start_objective = float(np.dot(c_cost, x_start))
+            if not warm.is_feasible(a_coup, b_flow, x_start, x_bound):
+                start_status = 'infeasible'
+                x_start = None
+
+        # Cold solve to compare against
+        if x_start is not None and self.warm_start == 'compare':
+            x, cold = self.solve_problem(problem, None)
+            cold_time = cold['setup_time'] + cold['solve_time']
+
+        x, info = self.solve_problem(problem, x_start)
+
+        if start_status is not None or x_start is not None:
+            info['warm_start'] = start_status or info.get('warm_start',
+                                                          'unused')
+            info['start_objective'] = start_objective
+            if start_time is not None:
+                info['start_time'] = start_time
+
+        if x_start is not None and self.warm_start == 'compare':
+            info['cold_time'] = cold_time
+            info['warm_start_saving'] = (cold_time - info['setup_time'] -
+                                         info['solve_time'] -
+                                         info.get('start_time', 0))
+
+        info['frame'] = self.n_solves if frame is None else frame
+        info['n_vertices'], info['n_edges'] = a_coup.shape
+        info['objective'] = float(np.dot(c_cost, x))
+        self.stats.append(info)
+        self.n_solves += 1
+        self._relaxation = relaxation_counts([info], self._relaxation)
+
+        return x
+
+    def solve_problem(self, problem, x_start=None):
+
+        # solve_problem
+        # Solve a whole frame pair, by components if set
+        #
+        # Inputs:   problem     -   (a_coup, b_flow, c_cost, x_bound,
+        #                           vertices) tuple
+        #           x_start     -   optional feasible starting solution
+        #
+        # Outputs:  x           -   integer solution vector
+        #           info        -   dict of solve stats
+        #
+
+        if self.components and problem[4] is not None:
+            return self.solve_components(*(problem + (x_start,)))
+
+        return self.solve_part(problem + (x_start,), self._state)
+
+    def solve_part(self, problem, state=None):
+
+        # solve_part
+        # Solve one problem, with the assignment fast path if it applies.
+        # Problems with no coupled split/merge columns are pure assignment
+        # problems and, if assignment is set, are solved exactly with
+        # scipy.optimize.linear_sum_assignment instead of the MILP backend
+        # (backend 'assignment' in stats). With relax set the backend
+        # solves the LP relaxation first and only solves the MILP when it
+        # is not integral, recorded as relaxation ('integral' or
+        # 'fallback') in stats.
+        #
+        # Inputs:   problem     -   (a_coup, b_flow, c_cost, x_bound,
+        #                           vertices, x_start) tuple, vertices and
+        #                           x_start may be None
+        #           state       -   backend keyword arguments, e.g. the
+        #                           solver object to reuse
+        #
+        # Outputs:  x           -   integer solution vector
+        #           info        -   dict of status, setup_time, solve_time
+        #                           and backend (and relaxation)
+        #
+
+        a_coup, b_flow, c_cost, x_bound, vertices, x_start = problem
+
+        # Pure assignment, the MILP is only a fallback
+        if (self.assignment and vertices is not None and
+                assign.is_assignment(a_coup)):
+            x, info = assign.solve_assignment(a_coup, b_flow, c_cost,
+                                              x_bound, vertices)
+            info['backend'] = 'assignment'
+            if info['status'] == 'optimal':
+                return x, info
+
+        kwargs = dict(state or {})
+        if x_start is not None:
+            kwargs['x_start'] = x_start
+        if self.relax:
+            kwargs['relax'] = True
+
+        x, info = opto.BACKENDS[self.backend](a_coup, b_flow, c_cost,
+                                              x_bound, **kwargs)
+        info['backend'] = self.backend
+
+        return x, info
+
+    def solve_components(self, a_coup, b_flow, c_cost, x_bound, vertices,
+                         x_start=None):
+
+        # solve_components
+        # Solve each connected component of the problem separately (see
+        # solve.components) and merge the solutions. Each component is
+        # solved with solve_part, in a pool of component_workers processes
+        # if given. Sessions already running in a worker process of track
+        # solve components in turn.
+        #
+        # Inputs:   a_coup      -   coupled incidence matrix
+        #           b_flow      -   sum of flow for each vertex
+        #           c_cost      -   vector of edge costs
+        #           x_bound     -   upper bound on each edge
+        #           vertices    -   order of vertices in coupled matrix
+        #           x_start     -   optional feasible starting solution
+        #
+        # Outputs:  x           -   integer solution vector
+        #           info        -   dict of status, setup_time, solve_time,
+        #                           backend, n_components and n_assignment
+        #                           (and warm_start if x_start was given)
+        #
+
+        start = time.time()
+
+        parts, a_d = decompose.components(a_coup, vertices)
+
+        if not parts:
+            return self.solve_part((a_coup, b_flow, c_cost, x_bound,
+                                    vertices, x_start), self._state)
+
+        problems = [decompose.subproblem(a_coup, c_cost, x_bound, vertices,
+                                         rows, cols, a_d, x_start=x_start)
+                    for rows, cols in parts]
+
+        setup = time.time()
+
+        if self._pool is not None:
+            results = self._pool.map(component_worker, problems)
+        else:
+            results = [self.solve_part(problem, self._state)
+                       for problem in problems]
+
+        x = decompose.merge(a_coup.shape[1], parts, a_d,
+                            [x_k for x_k, _ in results])
+
+        # Worst status of the components
+        statuses = [info_k['status'] for _, info_k in results]
+        status = 'optimal'
+        for worst in ('error', 'infeasible', 'feasible'):
+            if worst in statuses:
+                status = worst
+                break
+
+        info = {'status': status,
+                'setup_time': setup - start,
+                'solve_time': time.time() - setup,
+                'backend': self.backend,
+                'n_components': len(parts),
+                'n_assignment': sum(info_k['backend'] == 'assignment'
+                                    for _, info_k in results)}
+
+        # Start used if any component used it
+        if x_start is not None:
+            used = [info_k.get('warm_start') for _, info_k in results]
+            for warm_status in ('used', 'unsupported'):
+                if warm_status in used:
+                    info['warm_start'] = warm_status
+                    break
+
+        # Fallback if any component needed the MILP
+        relaxed = [info_k.get('relaxation') for _, info_k in results]
+        for relax_status in ('fallback', 'integral'):
+            if relax_status in relaxed:
+                info['relaxation'] = relax_status
+                break
+
+        return x, info
+
+    def last(self):
+
+        # last
+        # Stats of the most recent solve, None before the first solve
+
+        return self.stats[-1] if self.stats else None
+
+    def relaxation_stats(self):
+
+        # relaxation_stats
+        # How often the LP relaxation was integral and how often the MILP
+        # fallback fired over every solve of the session, see
+        # relaxation_counts
+        #
+        # Outputs:  counts  -   dict of n_relaxed, n_fallback and
+        #                       fallback_rate
+
+        return dict(self._relaxation)
+
+    def close(self):
+
+        # close
+        # Release the solver held by the session
+
+        if 'lp' in self._state:
+            import swiglpk as glpk
+            glpk.glp_delete_prob(self._state['lp'])
+
+        self._state = {}
+
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+
+# Session of a component worker process
+_component_session = None
+
+
+def init_component_worker(backend, assignment, relax=False):
+
+    # init_component_worker
+    # Create the session of a component worker process
+
+    global _component_session
+    _component_session = Session(backend, assignment=assignment, relax=relax)
+
+
+def component_worker(problem):
+
+    # component_worker
+    # Solve one component, run in a component worker process
+
+    return _component_session.solve_part(problem, _component_session._state)
+
+
+def relaxation_counts(stats, counts=None):
+
+    # relaxation_counts
+    # Count the solves that tried the LP relaxation first. Running counts
+    # are kept by passing the previous counts with the new solves' stats.
+    #
+    # Inputs:   stats   -   list of solve stats dicts, as Session.stats
+    #           counts  -   optional counts to add to, as returned
+    #
+    # Outputs:  counts  -   dict of n_relaxed (solves that tried the LP
+    #                       relaxation), n_fallback (of which needed the
+    #                       MILP) and fallback_rate (None if none tried)
+
+    relaxed = [info.get('relaxation') for info in stats]
+    n_relaxed = sum(r is not None for r in relaxed)
+    n_fallback = relaxed.count('fallback')
+
+    if counts is not None:
+        n_relaxed += counts['n_relaxed']
+        n_fallback += counts['n_fallback']
+
+    return {'n_relaxed': n_relaxed,
+            'n_fallback': n_fallback,
+            'fallback_rate': (float(n_fallback) / n_relaxed if n_relaxed
+                              else None)}
@@ -0,0 +1,205 @@
+# warm.py
+# Heuristic starting solutions. Consecutive frame pairs are very similar,
+# most cells move a little and keep their identity, so a greedy assignment
+# that follows each cell's last motion is usually close to optimal and can
+# seed the solver, e.g. as the starting basis of GLPK's simplex method.
+
+# Import external packages
+import numpy as np
+import scipy.sparse as sp
+
+# Import functions
+from ..graph.vertices import L, R, A, D
+from .assign import solve_assignment
+from .backends import constraint_bounds
+from .decode import MOVE
+
+__all__ = ['greedy_start', 'assignment_start', 'motion', 'is_feasible']
+
+
+def greedy_start(a_coup, c_cost, a_vertices, l_cells=None, r_cells=None,
+                 shift=None):
+
+    # greedy_start
+    # Feasible solution from a greedy nearest-neighbour assignment. L -> R
+    # edges are taken in order of distance from the L cell's predicted
+    # position (its centroid moved by shift) to the R cell, if both cells
+    # are free and the move costs no more than the cell disappearing and
+    # the other appearing. Cells left over disappear or appear, and no
+    # split/merge columns are used.
+    #
+    # Appear/disappear edges are pruned too, so the greedy pass can leave a
+    # cell with no way to disappear or appear. The start is then the
+    # optimal assignment over the simple columns instead (see
+    # solve.assign).
+    #
+    # Inputs:   a_coup      -   coupled incidence matrix
+    #           c_cost      -   vector of edge costs
+    #           a_vertices  -   order of vertices in coupled matrix
+    #                           (VertexTable)
+    #           l_cells     -   optional cell features of first frame, edges
+    #                           are taken in cost order without them
+    #           r_cells     -   optional cell features of second frame
+    #           shift       -   optional (n_l x 2) displacement of each L
+    #                           cell over the previous frame pair, see motion
+    #
+    # Outputs:  x           -   integer solution vector, None if no feasible
+    #                           start was found (cells can only be reached
+    #                           through split/merge columns)
+    #
+
+    a_csc = sp.csc_matrix(a_coup)
+    n_edges = a_csc.shape[1]
+    cost = np.asarray(c_cost, dtype=float)
+    kind = a_vertices.kind
+
+    # Source and target vertex of each simple (two entry) column
+    simple = np.flatnonzero(np.diff(a_csc.indptr) == 2)
+    entries = a_csc.indptr[simple]
+    first, second = a_csc.indices[entries], a_csc.indices[entries + 1]
+    forward = a_csc.data[entries] < 0
+    source = np.where(forward, first, second)
+    target = np.where(forward, second, first)
+
+    l_cell = source - a_vertices.start[L]
+    r_cell = target - a_vertices.start[R]
+    n_l = a_vertices.total(L)
+    n_r = a_vertices.total(R)
+
+    # Cheapest disappear/appear column of each cell and the A->D column
+    disappear = -np.ones(n_l, dtype=int)
+    appear = -np.ones(n_r, dtype=int)
+    a_d = -1
+
+    # Columns in decreasing cost order, so the cheapest of parallel columns
+    # is kept
+    order = np.argsort(-cost[simple], kind='mergesort')
+    s_kind, t_kind = kind[source[order]], kind[target[order]]
+    sel = (s_kind == L) & (t_kind == D)
+    disappear[l_cell[order][sel]] = simple[order][sel]
+    sel = (s_kind == A) & (t_kind == R)
+    appear[r_cell[order][sel]] = simple[order][sel]
+    sel = np.flatnonzero((s_kind == A) & (t_kind == D))
+    if len(sel):
+        a_d = simple[order][sel[-1]]
+
+    # Candidate moves, nearest first
+    move = (kind[source] == L) & (kind[target] == R)
+    m_col, m_l, m_r = simple[move], l_cell[move], r_cell[move]
+
+    if l_cells is not None and r_cells is not None:
+        predicted = np.asarray(l_cells['centroid'], dtype=float)[m_l]
+        if shift is not None:
+            predicted = predicted + np.nan_to_num(np.asarray(shift))[m_l]
+        distance = np.hypot(*(predicted -
+                              np.asarray(r_cells['centroid'])[m_r]).T)
+        order = np.lexsort((cost[m_col], distance))
+    else:
+        order = np.argsort(cost[m_col], kind='mergesort')
+
+    # Greedy assignment
+    x = np.zeros(n_edges, dtype=int)
+    l_free = np.ones(n_l, dtype=bool)
+    r_free = np.ones(n_r, dtype=bool)
+
+    for j, l, r in zip(m_col[order].tolist(), m_l[order].tolist(),
+                       m_r[order].tolist()):
+        if not (l_free[l] and r_free[r]):
+            continue
+        if disappear[l] >= 0 and appear[r] >= 0:
+            if cost[j] > cost[disappear[l]] + cost[appear[r]]:
+                continue
+        x[j] = 1
+        l_free[l] = r_free[r] = False
+
+    # Remaining cells disappear or appear
+    if np.any(disappear[l_free] < 0) or np.any(appear[r_free] < 0):
+        return assignment_start(a_csc, cost, a_vertices, simple, a_d)
+    x[disappear[l_free]] = 1
+    x[appear[r_free]] = 1
+
+    # A->D carries one unit for each move
+    n_moves = n_l - int(l_free.sum())
+    if n_moves:
+        if a_d < 0:
+            return None
+        x[a_d] = n_moves
+
+    return x
+
+
+def assignment_start(a_csc, cost, a_vertices, simple, a_d):
+
+    # assignment_start
+    # Optimal assignment over the simple columns only, see greedy_start
+    #
+    # Inputs:   a_csc       -   coupled incidence matrix (CSC)
+    #           cost        -   array of edge costs
+    #           a_vertices  -   order of vertices in coupled matrix
+    #           simple      -   indices of the simple columns
+    #           a_d         -   column index of the A->D edge, -1 if none
+    #
+    # Outputs:  x           -   integer solution vector, None if infeasible
+    #
+
+    bound = np.ones(len(simple), dtype=int)
+    bound[simple == a_d] = a_vertices.total(L)
+
+    x_simple, info = solve_assignment(a_csc[:, simple], None, cost[simple],
+                                      bound, a_vertices)
+    if info['status'] != 'optimal':
+        return None
+
+    x = np.zeros(a_csc.shape[1], dtype=int)
+    x[simple] = x_simple
+
+    return x
+
+
+def motion(assoc, a_vertices, l_cells, r_cells):
+
+    # motion
+    # Displacement of each R cell from the L cell it moved from, zero for
+    # cells that appeared, split or merged. The R cells of one frame pair
+    # are the L cells of the next, so this is the shift for greedy_start.
+    #
+    # Inputs:   assoc       -   association table, see solve.decode
+    #           a_vertices  -   order of vertices in coupled matrix
+    #           l_cells     -   cell features of first frame
+    #           r_cells     -   cell features of second frame
+    #
+    # Outputs:  shift       -   (n_r x 2) displacement of each R cell
+    #
+
+    shift = np.zeros((len(r_cells['area']), 2))
+
+    moved = assoc['event'] == MOVE
+    l = assoc['pred'][moved, 0] - a_vertices.start[L]
+    r = assoc['succ'][moved] - a_vertices.start[R]
+    shift[r] = (np.asarray(r_cells['centroid'])[r] -
+                np.asarray(l_cells['centroid'])[l])
+
+    return shift
+
+
+def is_feasible(a_coup, b_flow, x, x_bound):
+
+    # is_feasible
+    # Whether an integer vector satisfies the bounds and flow constraints
+    #
+    # Inputs:   a_coup      -   coupled incidence matrix
+    #           b_flow      -   sum of flow for each vertex
+    #           x           -   integer solution vector
+    #           x_bound     -   upper bound on each edge
+    #
+    # Outputs:  True if x is a feasible solution
+    #
+
+    x = np.asarray(x)
+    if np.any(x < 0) or np.any(x > np.asarray(x_bound)):
+        return False
+
+    lower, upper, exact = constraint_bounds(b_flow)
+    flow = sp.csc_matrix(a_coup).dot(x)
+
+    return bool(np.all(flow <= upper) and np.all(flow >= lower))
@@ -3,33 +3,118 @@
 # sequence of pre-segmented images.
 
 # Import external packages
+import cPickle as pickle
+import collections
 import glob
+import multiprocessing
+import os
+import time
+import warnings
 
 # Import function packages
-from tools import solve, output, graph, params
+from tools import solve, output, graph, params, frames
 
 
 def track(img_path, w=110, prune=(0.25, 0.2),
-          save_path=None, annotated=False, csv=False, json=False):
+          save_path=None, annotated=False, csv=False, json=False,
+          cache_dir=None, pair_radius=None, pair_k=None, max_edges=None,
+          solver='auto', workers=None, checkpoint=None, checkpoint_every=10,
+          resume_from=None, binary=None, labelled=False, min_size=50,
+          prefetch=None, assignment=True, components=False,
+          component_workers=None, warm_start=False, relax=False):
 
     # track
     # tracking function. Loops through sets of image files. For each pair,
     # graph structure is created, transformed to coupled matrix, solved and
     # output updated.
     #
-    # Inputs:   img_path    -  path to directory containing image files
+    # Inputs:   img_path    -  path to directory containing image files,
+    #                          a multi-page TIFF, a .npy file or a frame
+    #                          source (see frames.open_source, e.g. for raw
+    #                          files). Frames are read lazily.
     #           w           -  feature weights (set empirically)
     #           prune       -  pruning parameters (alpha, beta)
     #                          alpha: fraction of edges to retain
     #                          beta: fraction split/merge vertices to retain
     #           save_path   -  path to directory for saved output
     #           annotated   -  option to save annotated images of cell tracks
-    #           csv         -  option to save csv of output
+    #           csv         -  option to save csv of output, written as
+    #                          tracks finish
     #           json        -  option to save JSON of output
+    #           cache_dir   -  optional directory to cache extracted cell
+    #                          features in, so re-runs skip image decoding
+    #           pair_radius -  optional maximum distance between cells
+    #                          proposed as split/merge pairs
+    #           pair_k      -  optional number of nearest neighbours each
+    #                          cell is proposed as a split/merge pair with
+    #           max_edges   -  optional cap on the pruned edges retained from
+    #                          each cell/merge vertex, so the graph grows
+    #                          linearly with the number of cells
+    #           solver      -  solver backend: 'glpk' (GLPK via swiglpk),
+    #                          'pyomo' (Pyomo and glpsol) or 'auto' for the
+    #                          first available.
+    #                          The solver is kept in one solve.Session for
+    #                          the whole sequence, per-frame solve status and
+    #                          timings are printed as frames are tracked
+    #           workers     -  optional number of worker processes. Feature
+    #                          extraction, graph construction, matrix
+    #                          assembly and solving of frame pairs are
+    #                          spread over a process pool, only the output
+    #                          update runs in order on the main process
     #
+    #           checkpoint  -  optional path of a checkpoint file the
+    #                          tracker state is saved to periodically
+    #           checkpoint_every - number of frames between checkpoints
+    #           resume_from -  optional path of a checkpoint file to
+    #                          continue tracking from, e.g. after a failure
+    #           binary      -  optional binary output format: 'hdf5'
+    #                          (h5py), 'parquet' (pyarrow), 'npz' or 'auto'
+    #                          for the first available. Written as tracks
+    #                          finish.
+    #           labelled    -  frames are label images (each cell has its
+    #                          own integer label, background 0) rather than
+    #                          binary segmentations. Cell features are then
+    #                          found for all labels in one pass, without
+    #                          relabelling or filling holes.
+    #           min_size    -  cells of this area or less are discarded as
+    #                          segmented debris (filled area for binary
+    #                          segmentations)
+    #           prefetch    -  optional number of frames whose decoding,
+    #                          labelling and feature extraction run ahead
+    #                          in a thread pool while the current pair is
+    #                          solved. Only used without workers, whose
+    #                          pool already extracts features ahead.
+    #           assignment  -  solve frame pairs with no split/merge
+    #                          candidates left after pruning as a linear
+    #                          assignment problem rather than a MILP (same
+    #                          solution, much faster)
+    #           components  -  split each frame pair into the connected
+    #                          components of its graph (cells that compete
+    #                          for associations) and solve each as its own
+    #                          problem, see solve.components
+    #           component_workers - optional number of processes components
+    #                          are solved in
+    #           warm_start  -  start each MILP from a greedy assignment that
+    #                          follows the cells' motion over the previous
+    #                          pair (nearest neighbour for the first pair
+    #                          and with workers), for backends taking
+    #                          starts ('glpk'). 'compare' also solves each
+    #                          pair cold, the time saved is in the stats.
+    #           relax       -  solve the LP relaxation of each pair first
+    #                          and only solve the MILP when it is not
+    #                          integral. How often the MILP fallback was
+    #                          needed is printed per frame and at the end.
     #
-    # Outputs:  tracks      -  Output data structure for cell tracks.
-    #                          List of lists.
+    # Tracks are built by iter_tracks, which can be used directly to stream
+    # tracks as they terminate.
+    #
+    #
+    # Outputs:  output_data -  Output data structure, output_data['tracks']
+    #                          is a columnar output.TrackStore of the cell
+    #                          tracks: a table of observations (track ID,
+    #                          frame, centroid, area, bbox) and a table of
+    #                          parent track IDs. Its as_dict() gives the
+    #                          tracks by cell ID:
     #                          |Tracks                                     |
     #                          |   --> cell ID                             |
     #                          |       --> frame,                          |
@@ -37,53 +122,678 @@ def track(img_path, w=110, prune=(0.25, 0.2),
     #                          |           area,                           |
     #                          |           parent cell ID                  |
 
-    # List of images in directory
-    img_files = glob.glob(img_path + '/*.tif')
-
-    # Initialise output
+    # Finished tracks are kept in the output, as is the checkpointed state
     output_data = None
 
-    # For pairs of image frames
-    for i, img in enumerate(img_files):
-        if i < (len(img_files)-1):
+    # Tabular output is written as tracks finish
+    writers = []
 
-            # Define image paths
-            l_img = img
-            r_img = img_files[i+1]
+    # Running counts of the LP relaxations over every pair
+    counts = solve.relaxation_counts([])
+    if csv:
+        writers.append(output.open_writer(save_path, 'csv'))
+    if binary:
+        writers.append(output.open_writer(save_path, binary))
 
-            # Initialise graph
-            g = graph.construct(l_img, r_img, w=w, prune=prune)
+    for record in iter_tracks(img_path, w=w, prune=prune,
+                              cache_dir=cache_dir, pair_radius=pair_radius,
+                              pair_k=pair_k, max_edges=max_edges,
+                              solver=solver, workers=workers,
+                              keep_finished=True, checkpoint=checkpoint,
+                              checkpoint_every=checkpoint_every,
+                              resume_from=resume_from, labelled=labelled,
+                              min_size=min_size, prefetch=prefetch,
+                              assignment=assignment, components=components,
+                              component_workers=component_workers,
+                              warm_start=warm_start, relax=relax):
 
-            # Initialise output
-            if not output_data:
-                output_data = output.initialise_out(g.node)
-                if annotated:
-                    output.overlay(output_data, l_img, save_path)
+        output_data = record['output']
 
-            # Create the coupled incidence matrix.
-            a_coup, a_vertices = params.a_matrix(g)
-            b_flow = params.b_flow(a_vertices)
-            c_cost = params.c_cost(g, a_coup, a_vertices)
+        # Write tracks that finished in this frame, and when resuming those
+        # that finished before the checkpoint
+        if writers and resume_from is not None:
+            tracks = output_data['tracks']
+            earlier = [t for t in tracks
+                       if tracks.last_frame[t] < record['frame'] - 1]
+            write_tracks(writers, tracks.select(earlier))
+            resume_from = None
 
-            # Build optimisation model and solve
-            x = solve.opto(a_coup, b_flow, c_cost)
+        write_tracks(writers, record['finished'])
 
-            # Update output
-            output_data = output.update(g, a_coup, x, output_data, a_vertices)
+        # End of sequence
+        if record['stats'] is None:
+            continue
 
-            # print frame number to track progress
-            print('Tracked frame number: ' + str(i))
+        # If required, annotate first image
+        if annotated and record['frame'] == 1:
+            output.overlay(output_data, record['images'][0], save_path)
 
-            # If required, annotate images
-            if annotated:
-                output.overlay(output_data, r_img, save_path)
+        # print frame number to track progress
+        stats = record['stats']
+        counts = solve.relaxation_counts([stats], counts)
+        relaxation = ''
+        if 'relaxation' in stats:
+            relaxation = {'integral': ', LP', 'fallback': ', LP -> MILP'}[
+                stats['relaxation']]
+        print('Tracked frame number: ' + str(record['frame'] - 1) +
+              ' (' + stats['status'] + relaxation +
+              ', setup %.3fs, solve %.3fs)' % (stats['setup_time'],
+                                               stats['solve_time']))
 
+        # If required, annotate images
+        if annotated:
+            output.overlay(output_data, record['images'][1], save_path)
 
-    # If required, save output as csv or JSON
-    if csv:
-        output.save_csv(output_data, save_path)
+    for writer in writers:
+        writer.close()
 
+    # How often the LP relaxation was not integral
+    if counts['n_relaxed']:
+        print('MILP fallback: %d of %d LP relaxations (%.1f%%)' %
+              (counts['n_fallback'], counts['n_relaxed'],
+               100 * counts['fallback_rate']))
+
+    # If required, save output as JSON
     if json:
         output.save_json(output_data, save_path)
 
     return output_data
+
+
+def write_tracks(writers, tracks):
+
+    # write_tracks
+    # Write a set of tracks with each writer
+
+    for writer in writers:
+        writer.write(tracks)
+
+
+def iter_tracks(img_path, w=110, prune=(0.25, 0.2), cache_dir=None,
+                pair_radius=None, pair_k=None, max_edges=None, solver='auto',
+                workers=None, sink=None, keep_finished=False, checkpoint=None,
+                checkpoint_every=10, resume_from=None, labelled=False,
+                min_size=50, prefetch=None, assignment=True,
+                components=False, component_workers=None, warm_start=False,
+                relax=False):
+
+    # iter_tracks
+    # Streaming form of track. Yields a record as each frame pair is solved,
+    # holding the associations of that pair and the tracks that have
+    # terminated. Only the tracks of cells in the current frame are kept in
+    # memory, so memory depends on the number of live cells rather than the
+    # length of the sequence. When the sequence ends a final record with no
+    # associations and stats of None flushes the tracks still active.
+    #
+    # Inputs:   img_path    -  frames to track, as track
+    #           sink        -  optional function called as
+    #                          sink(cell_id, track) for each finished track
+    #           keep_finished - keep finished tracks in the output rather
+    #                          than only passing them on
+    #           checkpoint  -  optional path of a checkpoint file, saved
+    #                          every checkpoint_every frames once the
+    #                          records up to that frame have been consumed
+    #           resume_from -  optional checkpoint file to continue from.
+    #                          Tracks finished before the checkpoint are not
+    #                          yielded again.
+    #           others      -  as track
+    #
+    # Outputs:  record      -  dict for each frame pair:
+    #                          frame        - frame number of second image
+    #                          images       - paths of the pair of images
+    #                          associations - associations of the pair as
+    #                                         vertex labels, see
+    #                                         output.associations
+    #                          finished     - TrackStore of tracks
+    #                                         terminated
+    #                          output       - output data of active tracks
+    #                          stats        - solver stats of the pair
+    #
+
+    # Frames of the sequence, read lazily
+    source = frames.open_source(img_path)
+    start = 0
+
+    # Graph and solver options shared by every frame pair
+    options = {'w': w, 'prune': prune, 'pair_radius': pair_radius,
+               'pair_k': pair_k, 'max_edges': max_edges}
+
+    # Feature extraction options shared by every frame
+    feature_options = {'cache_dir': cache_dir, 'labelled': labelled,
+                       'min_size': min_size}
+
+    # Solver session options, other than the backend
+    solver_options = {'assignment': assignment, 'components': components,
+                      'component_workers': component_workers,
+                      'warm_start': warm_start, 'relax': relax}
+
+    tracker = Tracker(solver=solver, sink=sink, keep_finished=keep_finished,
+                      **dict(options, **dict(feature_options,
+                                             **solver_options)))
+    l_frame = None
+
+    # Continue after the last frame of the checkpoint, from its features
+    if resume_from is not None:
+        tracker.restore(resume_from)
+        start = tracker.frames
+
+        # Paths are compared resolved, the checkpoint may have been made
+        # with a relative or linked path to the same images
+        if (start > len(source) or
+                os.path.realpath(source.name(start - 1)) !=
+                os.path.realpath(tracker.l_img)):
+            raise ValueError('Checkpoint does not match image sequence: ' +
+                             resume_from)
+        l_frame = (tracker.l_img, tracker.l_feat, tracker.shift)
+
+    # Solved frame pairs, in order
+    if workers and workers > 1:
+        pairs = parallel_pairs(source, options, solver, workers,
+                               feature_options=feature_options, start=start,
+                               solver_options=solver_options,
+                               l_frame=l_frame)
+    else:
+        pairs = serial_pairs(source, options, solver,
+                             feature_options=feature_options, start=start,
+                             prefetch=prefetch, solver_options=solver_options,
+                             l_frame=l_frame)
+
+    for pair in pairs:
+        yield tracker.update(*pair)
+
+        if checkpoint is not None and tracker.frames % checkpoint_every == 0:
+            tracker.save(checkpoint)
+
+    # End of sequence, remaining tracks terminate
+    if tracker.output:
+        yield tracker.finish()
+
+
+def watch(img_path, poll=1.0, idle_timeout=None, pattern='*.tif',
+          checkpoint=None, checkpoint_every=10, resume_from=None, **kwargs):
+
+    # watch
+    # Live tracking of a directory that image frames are being written
+    # into. The tracker state is kept between frames and each new frame is
+    # tracked as soon as it has been completely written, i.e. its size and
+    # modification time are unchanged over one poll. Frames are taken in
+    # order of file name.
+    #
+    # Inputs:   img_path        -  directory the frames are written to
+    #           poll            -  seconds between checks for new frames
+    #           idle_timeout    -  optional number of seconds with no new
+    #                              frame after which watching stops, by
+    #                              default watch forever
+    #           pattern         -  glob pattern of frame files
+    #           checkpoint      -  optional path of a checkpoint file
+    #           checkpoint_every - number of frames between checkpoints
+    #           resume_from     -  optional checkpoint file to continue
+    #                              from, frames up to and including the
+    #                              checkpoint's last frame are skipped
+    #           kwargs          -  Tracker options, as track
+    #
+    # Outputs:  record          -  dict for each new frame, as iter_tracks.
+    #                              The current tracks are in
+    #                              record['output']['tracks'].
+    #
+
+    tracker = Tracker(**kwargs)
+
+    try:
+        seen = set()
+        if resume_from is not None:
+            tracker.restore(resume_from)
+            seen.update(f for f in glob.glob(os.path.join(img_path, pattern))
+                        if f <= tracker.l_img)
+
+        pending = {}
+        last_new = time.time()
+
+        while idle_timeout is None or time.time() - last_new < idle_timeout:
+
+            # Frames not yet tracked, ready once no longer being written
+            ready = []
+            files = sorted(glob.glob(os.path.join(img_path, pattern)))
+            for img_file in files:
+                if img_file in seen:
+                    continue
+
+                stat = os.stat(img_file)
+                state = (stat.st_size, stat.st_mtime)
+                if pending.get(img_file) == state:
+                    ready.append(img_file)
+                else:
+                    pending[img_file] = state
+
+            for img_file in ready:
+                seen.add(img_file)
+                del pending[img_file]
+                last_new = time.time()
+
+                record = tracker.add(img_file)
+                if record is not None:
+                    yield record
+
+                    if (checkpoint is not None and
+                            tracker.frames % checkpoint_every == 0):
+                        tracker.save(checkpoint)
+
+            time.sleep(poll)
+
+        # Watching stopped, remaining tracks terminate
+        if tracker.output:
+            yield tracker.finish()
+    finally:
+        # Release the solver also when watching is interrupted
+        tracker.close()
+
+
+class Tracker(object):
+
+    # Tracker
+    # Tracker state held between frames: the last frame's cell features,
+    # the solver session and the output data of active tracks. Frames can
+    # be added one at a time with add, or already solved pairs passed to
+    # update.
+    #
+    # Attributes:   output  - output data of the active tracks (and
+    #                         finished tracks if kept), None before the
+    #                         first pair
+    #               frames  - number of frames tracked
+    #               l_img   - last frame tracked
+    #               l_feat  - cell features of last frame
+    #               shift   - motion of the cells of the last frame, for
+    #                         warm starts
+    #
+
+    def __init__(self, w=110, prune=(0.25, 0.2), cache_dir=None,
+                 pair_radius=None, pair_k=None, max_edges=None,
+                 solver='auto', sink=None, keep_finished=False,
+                 labelled=False, min_size=50, assignment=True,
+                 components=False, component_workers=None, warm_start=False,
+                 relax=False):
+
+        self.options = {'w': w, 'prune': prune, 'pair_radius': pair_radius,
+                        'pair_k': pair_k, 'max_edges': max_edges}
+        self.feature_options = {'cache_dir': cache_dir, 'labelled': labelled,
+                                'min_size': min_size}
+        self.solver = solver
+        self.solver_options = {'assignment': assignment,
+                               'components': components,
+                               'component_workers': component_workers,
+                               'warm_start': warm_start,
+                               'relax': relax}
+        self.sink = sink
+        self.keep_finished = keep_finished
+
+        self.output = None
+        self.frames = 0
+        self.session = None
+        self.l_img, self.l_feat = None, None
+        self.shift = None
+
+    def add(self, img_file):
+
+        # add
+        # Track the next frame of the sequence
+        #
+        # Inputs:   img_file    -  path to image file
+        # Outputs:  record      -  as iter_tracks, None for the first frame
+        #
+
+        r_feat = frames.frame_features(img_file, **self.feature_options)
+
+        # First frame
+        if self.l_feat is None:
+            self.l_img, self.l_feat = img_file, r_feat
+            self.frames = 1
+            return None
+
+        if self.session is None:
+            self.session = solve.Session(self.solver, **self.solver_options)
+
+        g, a_coup, a_vertices, x = track_pair(self.l_feat, r_feat,
+                                              self.session, self.options,
+                                              frame=self.frames - 1,
+                                              shift=self.shift)
+
+        return self.update(self.l_img, img_file, g, a_coup, a_vertices, x,
+                           self.session.last())
+
+    def update(self, l_img, r_img, g, a_coup, a_vertices, x, stats):
+
+        # update
+        # Update the tracks with a solved frame pair and flush the tracks
+        # that terminated
+        #
+        # Inputs:   as yielded by serial_pairs
+        # Outputs:  record      -  as iter_tracks
+        #
+
+        # Initialise output
+        if not self.output:
+            self.output = output.initialise_out(g)
+
+        # Update output and flush terminated tracks
+        assoc = solve.decode(a_coup, x, a_vertices)
+        self.output = output.update(g, a_coup, x, self.output, a_vertices,
+                                    assoc=assoc)
+        finished = output.finish_tracks(self.output, keep=self.keep_finished)
+
+        # Second frame becomes the first of the next pair
+        self.l_img, self.l_feat = r_img, g.graph['r_cells']
+        if self.solver_options['warm_start']:
+            self.shift = solve.motion(assoc, a_vertices, g.graph['l_cells'],
+                                      g.graph['r_cells'])
+        self.frames = self.output['frame'] + 1
+
+        return self.flush({'frame': self.output['frame'],
+                           'images': (l_img, r_img),
+                           'associations': output.associations(assoc,
+                                                               a_vertices),
+                           'finished': finished,
+                           'output': self.output,
+                           'stats': stats})
+
+    def tracks(self):
+
+        # tracks
+        # Current (active) tracks
+
+        return self.output['tracks'] if self.output else {}
+
+    def finish(self):
+
+        # finish
+        # End of the sequence, flush all remaining tracks
+        #
+        # Outputs:  record      -  as iter_tracks, with no associations
+
+        return self.flush({'frame': self.output['frame'],
+                           'images': None,
+                           'associations': [],
+                           'finished': output.finish_tracks(
+                               self.output, end=True,
+                               keep=self.keep_finished),
+                           'output': self.output,
+                           'stats': None})
+
+    def flush(self, record):
+
+        # flush
+        # Pass the finished tracks of a record to the sink, if any
+
+        if self.sink is not None:
+            for cell_id, track in record['finished'].iteritems():
+                self.sink(cell_id, track)
+
+        return record
+
+    def save(self, path):
+
+        # save
+        # Checkpoint the tracker state (frame count, last frame and its cell
+        # features and motion, output data) to a binary file. The file is
+        # written under a temporary name and renamed, so an interrupted save
+        # leaves the previous checkpoint intact.
+        #
+        # Inputs:   path    -  checkpoint file path
+        #
+
+        state = {'frames': self.frames,
+                 'l_img': self.l_img,
+                 'l_feat': self.l_feat,
+                 'shift': self.shift,
+                 'output': self.output,
+                 'options': self.options}
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_path, path)
+
+    def restore(self, path):
+
+        # restore
+        # Load the tracker state from a checkpoint file written by save
+        #
+        # Inputs:   path    -  checkpoint file path
+        #
+
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+
+        if state['options'] != self.options:
+            warnings.warn('Resuming from a checkpoint made with different '
+                          'tracking options.')
+
+        self.frames = state['frames']
+        self.l_img = state['l_img']
+        self.l_feat = state['l_feat']
+        self.shift = state.get('shift')
+        self.output = state['output']
+
+    def close(self):
+
+        # close
+        # Release the solver session
+
+        if self.session is not None:
+            self.session.close()
+
+
+def track_pair(l_feat, r_feat, session, options, frame=None, shift=None):
+
+    # track_pair
+    # Everything for one pair of frames that does not depend on earlier
+    # pairs: graph construction, coupled matrix and solve.
+    #
+    # Inputs:   l_feat      -  cell features of first frame
+    #           r_feat      -  cell features of second frame
+    #           session     -  solve.Session used for the solve
+    #           options     -  dict of graph.construct keyword arguments
+    #           frame       -  optional frame number recorded in the
+    #                          session stats
+    #           shift       -  optional displacement of each cell of the
+    #                          first frame over the previous pair, used for
+    #                          the warm start if the session takes one
+    #
+    # Outputs:  g           -  graph structure
+    #           a_coup      -  coupled incidence matrix
+    #           a_vertices  -  order of vertices in coupled matrix
+    #           x           -  solution vector
+    #
+
+    # Initialise graph
+    g = graph.construct(l_feat, r_feat, **options)
+
+    # Create the coupled incidence matrix.
+    a_coup, a_vertices, a_edges = params.a_matrix(g)
+    b_flow = params.b_flow(a_vertices)
+    c_cost = params.c_cost(g, a_coup, a_edges)
+    x_bound = params.x_bound(a_coup, a_vertices)
+
+    # Heuristic starting solution, cells follow their last motion
+    x_start, start_time = None, None
+    if session.warm_start:
+        start = time.time()
+        x_start = solve.greedy_start(a_coup, c_cost, a_vertices, l_feat,
+                                     r_feat, shift=shift)
+        start_time = time.time() - start
+
+    # Build optimisation model and solve
+    x = session.solve(a_coup, b_flow, c_cost, x_bound, frame=frame,
+                      vertices=a_vertices, x_start=x_start,
+                      start_time=start_time)
+
+    return g, a_coup, a_vertices, x
+
+
+def serial_pairs(source, options, solver, feature_options=None, start=0,
+                 prefetch=None, solver_options=None, l_frame=None):
+
+    # serial_pairs
+    # Generator over solved frame pairs, one after another. Cell features
+    # are extracted once per frame and carried forward as the left frame of
+    # the following pair.
+    #
+    # Inputs:   source      -  frame source
+    #           options     -  dict of graph.construct keyword arguments
+    #           solver      -  solver backend
+    #           feature_options - optional dict of frames.source_features
+    #                          keyword arguments (cache_dir, labelled,
+    #                          min_size)
+    #           start       -  index of first frame
+    #           prefetch    -  optional number of frames extracted ahead in
+    #                          a thread pool, see frames.prefetch_features
+    #           solver_options - optional dict of further solve.Session
+    #                          keyword arguments
+    #           l_frame     -  optional (name, features, shift) of the frame
+    #                          before start, e.g. from a checkpoint, so the
+    #                          first pair is (start - 1, start)
+    #
+    # Outputs:  (l_img, r_img, g, a_coup, a_vertices, x, stats) per pair,
+    #           l_img and r_img are the frame names
+    #
+
+    session = solve.Session(solver, **(solver_options or {}))
+
+    # Features of each frame, extracted ahead if prefetching
+    if prefetch:
+        features = frames.prefetch_features(source, depth=prefetch,
+                                            start=start,
+                                            **(feature_options or {}))
+    else:
+        features = frames.sequence_features(source, start=start,
+                                            **(feature_options or {}))
+
+    l_img, l_feat, shift = l_frame or (None, None, None)
+    try:
+        for i, (r_img, r_feat) in enumerate(features, start):
+            if l_feat is not None:
+                g, a_coup, a_vertices, x = track_pair(l_feat, r_feat,
+                                                      session, options,
+                                                      frame=i - 1,
+                                                      shift=shift)
+                yield l_img, r_img, g, a_coup, a_vertices, x, session.last()
+
+                # Motion of each cell, for the next pair's warm start
+                if session.warm_start:
+                    shift = solve.motion(solve.decode(a_coup, x, a_vertices),
+                                         a_vertices, l_feat, r_feat)
+
+            l_img, l_feat = r_img, r_feat
+    finally:
+        features.close()
+        session.close()
+
+
+def parallel_pairs(source, options, solver, workers, feature_options=None,
+                   start=0, solver_options=None, l_frame=None):
+
+    # parallel_pairs
+    # Generator over solved frame pairs, computed by a pool of worker
+    # processes. Features of each frame are extracted once by the pool,
+    # then pairs are built and solved by the pool, each worker holding its
+    # own solver session. Results are yielded in frame order. Frames and
+    # pairs are only submitted as earlier results are taken (as
+    # frames.prefetch_features), so at most 2 x workers of each are held
+    # at once however long the sequence.
+    #
+    # Inputs:   source      -  frame source
+    #           options     -  dict of graph.construct keyword arguments
+    #           solver      -  solver backend
+    #           workers     -  number of worker processes
+    #           feature_options - optional dict of frames.source_features
+    #                          keyword arguments
+    #           start       -  index of first frame
+    #           solver_options - optional dict of further solve.Session
+    #                          keyword arguments
+    #           l_frame     -  optional (name, features, shift) of the frame
+    #                          before start, as serial_pairs (shift is not
+    #                          used, workers start from nearest neighbours)
+    #
+    # Outputs:  (l_img, r_img, g, a_coup, a_vertices, x, stats) per pair,
+    #           l_img and r_img are the frame names
+    #
+
+    pool = multiprocessing.Pool(workers, init_worker,
+                                (solver, source, solver_options))
+    depth = 2 * workers
+
+    # Frames and pairs submitted and not yet taken, in frame order
+    features = collections.deque()
+    pairs = collections.deque()
+    indices = iter(xrange(start, len(source)))
+
+    def submit_frame():
+        i = next(indices, None)
+        if i is not None:
+            features.append(pool.apply_async(
+                feature_worker, ((i, feature_options or {}),)))
+
+    try:
+        for _ in xrange(depth):
+            submit_frame()
+
+        l_feat = l_frame[1] if l_frame else None
+        frame = start
+        while features or pairs:
+            # Pairs of the frames extracted so far, up to depth at once
+            while features and len(pairs) < depth:
+                r_feat = features.popleft().get()
+                submit_frame()
+                if l_feat is not None:
+                    pairs.append((frame - 1, pool.apply_async(
+                        pair_worker, ((l_feat, r_feat, options, frame - 1),))))
+                l_feat, frame = r_feat, frame + 1
+
+            # Single frame, no pairs
+            if not pairs:
+                break
+
+            i, result = pairs.popleft()
+            yield (source.name(i), source.name(i+1)) + result.get()
+
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+# Solver session and frame source of a worker process
+_worker_session = None
+_worker_source = None
+
+
+def init_worker(solver, source, solver_options=None):
+
+    # init_worker
+    # Create the solver session of a worker process, kept for all the pairs
+    # the worker solves, and keep the frame source
+
+    global _worker_session, _worker_source
+    _worker_session = solve.Session(solver, **(solver_options or {}))
+    _worker_source = source
+
+
+def feature_worker(job):
+
+    # feature_worker
+    # Cell features of one frame, run in a worker process
+
+    i, feature_options = job
+
+    return frames.source_features(_worker_source, i, **feature_options)
+
+
+def pair_worker(job):
+
+    # pair_worker
+    # Build and solve one frame pair, run in a worker process
+
+    l_feat, r_feat, options, frame = job
+    g, a_coup, a_vertices, x = track_pair(l_feat, r_feat, _worker_session,
+                                          options, frame=frame)
+
+    return g, a_coup, a_vertices, x, _worker_session.last()